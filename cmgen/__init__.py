@@ -1,2 +1,4 @@
+from cmgen._version import __version__
 from cmgen.database_generator import *
-from cmgen.model_generator import *
\ No newline at end of file
+from cmgen.model_generator import *
+from cmgen.pipeline import *
@@ -0,0 +1,154 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cmgen.database_generator import merged_database_generator
+from cmgen.keyword_index import keyword_index_generator
+from cmgen.manifest import BuildManifest
+from cmgen.template_registry import get_template_registry
+from cmgen.pipeline import default_output_files, generate_all
+
+CONFIG_EXTENSIONS = ('.yaml', '.yml')
+
+
+def find_configuration_files(paths):
+    # Expand directories and glob patterns into a sorted list of yaml files
+    configuration_files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for ext in CONFIG_EXTENSIONS:
+                configuration_files.update(glob.glob(os.path.join(path, '**', '*'+ext), recursive=True))
+        elif os.path.isfile(path):
+            configuration_files.add(path)
+        else:
+            configuration_files.update(f for f in glob.glob(path, recursive=True) if os.path.isfile(f))
+    return sorted(configuration_files)
+
+
+def _init_worker(template_file):
+    # Warm the template registry once per worker process. With the fork start
+    # method it is already inherited from the parent and this is a lookup.
+    get_template_registry(template_file)
+
+
+def _generate_one(job):
+    # entries holds the previous manifest entries of this job's outputs, or None
+    # when running without a manifest. The updated entries are sent back to the
+    # parent process, which owns the manifest file.
+    configuration_file, model_file, schema_file, template_file, entries = job
+    manifest = BuildManifest(entries=entries) if entries is not None else None
+    start = time.perf_counter()
+    try:
+        written = any(generate_all(configuration_file, model_file, schema_file,
+                                   template_file=template_file, manifest=manifest))
+    except Exception as e:
+        return configuration_file, time.perf_counter() - start, f'{type(e).__name__}: {e}', False, None
+    entries = manifest.entries if manifest is not None else None
+    return configuration_file, time.perf_counter() - start, None, written, entries
+
+
+def _manifest_entries(manifest, *output_files):
+    if manifest is None:
+        return None
+    keys = [manifest.key(f) for f in output_files]
+    return {key: manifest.entries[key] for key in keys if key in manifest.entries}
+
+
+def _write_catalog_file(generator, configuration_files, output_file, description, report):
+    # Write one file for all of configuration_files, e.g. the merged schema.
+    # Returns (output_file, seconds, error) like the per-configuration results.
+    start = time.perf_counter()
+    try:
+        generator(configuration_files, output_file)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        report(f'{output_file}: FAILED ({error})')
+        return output_file, time.perf_counter() - start, error
+    report(f'{output_file}: {description} of {len(configuration_files)} models')
+    return output_file, time.perf_counter() - start, None
+
+
+def generate_batch(configuration_files, output_dir=None, template_file=None, jobs=None, manifest_file=None,
+                   merged_schema_file=None, keyword_index_file=None, report=print):
+    # Generate the model .py and schema .rng for every configuration file in a
+    # process pool. With manifest_file, outputs whose inputs are unchanged since
+    # the previous run are left untouched. merged_schema_file additionally
+    # gets one schema for the models of the configuration files generated
+    # without error, and keyword_index_file the parameter keyword index of
+    # the same models.
+    # Raises ValueError when two configuration files would write the same
+    # output, e.g. a/model.yaml and b/model.yaml with one output_dir.
+    # Returns the list of (configuration_file, seconds, error), followed by
+    # (output_file, seconds, error) for merged_schema_file and
+    # keyword_index_file when they are given.
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    get_template_registry(template_file)
+    manifest = BuildManifest(manifest_file) if manifest_file is not None else None
+    tasks = []
+    targets = {}
+    for f in configuration_files:
+        model_file, schema_file = default_output_files(f, output_dir)
+        for output_file in (model_file, schema_file):
+            other = targets.setdefault(os.path.abspath(output_file), f)
+            if other != f:
+                raise ValueError(f'{other} and {f} would both write {output_file}')
+        tasks.append((f, model_file, schema_file, template_file, _manifest_entries(manifest, model_file, schema_file)))
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (jobs * 4))
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(template_file,)) as executor:
+        for configuration_file, seconds, error, written, entries in executor.map(_generate_one, tasks, chunksize=chunksize):
+            results.append((configuration_file, seconds, error))
+            if entries is not None:
+                manifest.entries.update(entries)
+            if error is not None:
+                report(f'{configuration_file}: FAILED ({error})')
+            elif written:
+                report(f'{configuration_file}: {seconds*1000:.1f} ms')
+            else:
+                report(f'{configuration_file}: up to date ({seconds*1000:.1f} ms)')
+    if manifest is not None:
+        manifest.save()
+    succeeded = [configuration_file for configuration_file, _, error in results if error is None]
+    catalog_results = []
+    if merged_schema_file is not None:
+        catalog_results.append(_write_catalog_file(merged_database_generator, succeeded, merged_schema_file,
+                                                   'merged schema', report))
+    if keyword_index_file is not None:
+        catalog_results.append(_write_catalog_file(keyword_index_generator, succeeded, keyword_index_file,
+                                                   'keyword index', report))
+    elapsed = time.perf_counter() - start
+    n_failed = sum(1 for result in results if result[2] is not None)
+    n_done = len(results) - n_failed
+    rate = n_done / elapsed if elapsed > 0 else 0.
+    report(f'{n_done} configurations processed, {n_failed} failed in {elapsed:.2f} s '
+           f'({rate:.1f} configurations/s, {jobs} workers)')
+    return results + catalog_results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='cmgen', description='Generate custom model templates (.py) and XML database schemas (.rng) from yaml configuration files.')
+    parser.add_argument('configs', nargs='+', help='configuration files, directories or glob patterns')
+    parser.add_argument('-o', '--output-dir', default=None, help='directory for generated files (default: next to each configuration file)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--template-file', default=None, help='template registry (template_functions.json or its .bin form) to use instead of the packaged one')
+    parser.add_argument('--manifest', default=None, help='build manifest file; outputs whose inputs did not change since the previous run are left untouched')
+    parser.add_argument('--merged-schema', default=None, help='also write one schema (.rng) for all the models')
+    parser.add_argument('--keyword-index', default=None, help='also write the parameter keyword index (.json) of all the models')
+    args = parser.parse_args(argv)
+
+    configuration_files = find_configuration_files(args.configs)
+    if len(configuration_files) == 0:
+        parser.error('no configuration files found')
+    try:
+        results = generate_batch(configuration_files, output_dir=args.output_dir,
+                                 template_file=args.template_file, jobs=args.jobs,
+                                 manifest_file=args.manifest, merged_schema_file=args.merged_schema,
+                                 keyword_index_file=args.keyword_index)
+    except ValueError as e:
+        parser.error(str(e))
+    return 1 if any(error is not None for _, _, error in results) else 0
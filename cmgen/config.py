@@ -0,0 +1,31 @@
+import os
+import yaml
+
+# Use the libyaml based loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Parsed configuration files keyed by absolute path, stored with the
+# (mtime, size) they were parsed at
+_configurations = {}
+
+
+def load_configuration(configuration_file):
+    # Parse a yaml configuration file, reusing the previous result while the
+    # file is unchanged. The returned dict is shared and must not be modified.
+    path = os.path.abspath(configuration_file)
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _configurations.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, 'r') as file:
+        setting = yaml.load(file, Loader=SafeLoader)
+    _configurations[path] = (key, setting)
+    return setting
+
+
+def clear_configuration_cache():
+    _configurations.clear()
@@ -1,9 +1,21 @@
-import yaml
+import copy
+import itertools
 from lxml import etree
+from cmgen._version import __version__
+from cmgen.config import load_configuration
+from cmgen.manifest import environment_digest, section_digest
+
+def rng_inputs_from_setting(setting):
+    name=setting['database']["name"]
+    Model_des=setting['database']["description"]
+    Model_name=dict()
+    Model_name[name]=Model_des
+    Parameters=setting['database']["parameters"]
+    Options=setting['database'].get("options")
+    return Model_name, Parameters, Options
 
 def yaml_to_rng_input_strings(yaml_input_file):
-    with open(yaml_input_file, 'r') as file:
-        setting=yaml.safe_load(file)
+    setting=load_configuration(yaml_input_file)
     name=setting['database']["name"]
     Model_des=setting['database']["description"]
     Model_name=dict()
@@ -15,11 +27,23 @@ def yaml_to_rng_input_strings(yaml_input_file):
     else: 
         return Model_name, Parameters
     
-def generate_rng_schema(Model_name, Parameters, Options=None):
-    model_name, model_des = list(Model_name.items())[0]
-    # Define the RNG schema
-    ns_structure = "http://relaxng.org/ns/structure/1.0"
-    ns_annotations = "http://relaxng.org/ns/compatibility/annotations/1.0"
+# Namespaces of the generated grammars
+ns_structure = "http://relaxng.org/ns/structure/1.0"
+ns_annotations = "http://relaxng.org/ns/compatibility/annotations/1.0"
+
+# Grammar without the model specific parts, built once by _rng_skeleton()
+_skeleton = None
+# Finished schema trees, keyed by (name, description, parameters, options)
+_rng_schemas = {}
+
+def _rng_skeleton():
+    # The grammar every generated schema shares. Model names, the model
+    # description and the parameter choices are left empty and filled in by
+    # generate_rng_schema on a copy; empty attributes keep their position so
+    # the output is unchanged.
+    global _skeleton
+    if _skeleton is not None:
+        return _skeleton
     nsmap = {None: ns_structure, 'a': ns_annotations}
 
     # Create grammar element
@@ -28,7 +52,7 @@ def generate_rng_schema(Model_name, Parameters, Options=None):
     include_element = etree.SubElement(grammar_schema, "include", href="core.rng")
 
     #Model ConstituentArrary
-    define_cons_element = etree.SubElement(grammar_schema, "define", name=model_name+"ConstituentArray")
+    define_cons_element = etree.SubElement(grammar_schema, "define", name="")
     element_element = etree.SubElement(define_cons_element, 'element', name="ConstituentArray")
     one_or_more_element = etree.SubElement(element_element, 'oneOrMore')
     site_element = etree.SubElement(one_or_more_element, 'element', name="Site")
@@ -51,16 +75,14 @@ def generate_rng_schema(Model_name, Parameters, Options=None):
     constituent_data = etree.SubElement(constituent_attr, 'data', type="string")
     
     #Model definition
-    define_model_element = etree.SubElement(grammar_schema, "define", name=model_name+".model", combine="choice")
+    define_model_element = etree.SubElement(grammar_schema, "define", name="", combine="choice")
     model_element = etree.SubElement(define_model_element, 'element', name="Model")
     type_attribute = etree.SubElement(model_element, 'attribute', name="type")
     type_a_documentation = etree.SubElement(type_attribute, etree.QName(ns_annotations, "documentation"))
-    type_a_documentation.text = model_des
     type_value = etree.SubElement(type_attribute, 'value')
-    type_value.text = model_name
 
     interleave_element = etree.SubElement(model_element, 'interleave')
-    model_constituent_array_ref = etree.SubElement(interleave_element, 'ref', name=model_name+"ConstituentArray")
+    model_constituent_array_ref = etree.SubElement(interleave_element, 'ref', name="")
 
     optional_element = etree.SubElement(interleave_element, 'optional')
     chemical_groups_element = etree.SubElement(optional_element, 'element', name="ChemicalGroups")
@@ -80,23 +102,39 @@ def generate_rng_schema(Model_name, Parameters, Options=None):
     type_attribute = etree.SubElement(parameter_element, 'attribute', name="type")
     type_choice = etree.SubElement(type_attribute, 'choice')
 
-    value_list = list(Parameters.keys())
-    a_documentation_list = list(Parameters.values())
-    
-    for value, a_documentation in zip(value_list, a_documentation_list):
-        value_element = etree.SubElement(type_choice, 'value')
-        value_element.text = value
-        a_documentation_element = etree.SubElement(type_choice, etree.QName(ns_annotations, "documentation"))
-        a_documentation_element.text = a_documentation
-
     interleave_element = etree.SubElement(parameter_element, 'interleave')
     optional_element = etree.SubElement(interleave_element, 'optional')
     text_element = etree.SubElement(optional_element, 'text')
     zero_or_more_element = etree.SubElement(interleave_element, 'zeroOrMore')
     ref_element = etree.SubElement(zero_or_more_element, 'ref', name="Interval")
-    model_constituent_array_ref = etree.SubElement(interleave_element, 'ref', name=model_name+"ConstituentArray")
+    model_constituent_array_ref = etree.SubElement(interleave_element, 'ref', name="")
 
-    
+    comment=etree.Comment('Please modify database.rng and parser.py in pycalphad-xml')
+    grammar_schema.append(comment)
+    _skeleton = grammar_schema
+    return _skeleton
+
+def _schema_key(Model_name, Parameters, Options):
+    try:
+        key = (tuple(Model_name.items()), tuple(Parameters.items()),
+               tuple(Options) if Options is not None else None)
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+def generate_rng_schema(Model_name, Parameters, Options=None):
+    # Finished schemas are memoized; every call returns its own copy, since
+    # callers such as save_rng_schema modify the tree.
+    key = _schema_key(Model_name, Parameters, Options)
+    schema_tree = _rng_schemas.get(key) if key is not None else None
+    if schema_tree is None:
+        schema_tree = _build_rng_schema(Model_name, Parameters, Options)
+        if key is not None:
+            _rng_schemas[key] = schema_tree
+    return copy.deepcopy(schema_tree)
+
+def _add_options(interleave_element, Options):
     #Optional addings
     if Options is not None:
         if len(Options) > 1 :
@@ -113,13 +151,113 @@ def generate_rng_schema(Model_name, Parameters, Options=None):
             comment=etree.Comment('Please finalize details of this optional adding.')
             optadd_element.append(comment)
 
-    # Create the RNG schema tree
-    comment=etree.Comment('Please modify database.rng and parser.py in pycalphad-xml')
-    grammar_schema.append(comment)
-    schema_tree = etree.ElementTree(grammar_schema)
-    
+def _model_grammar(model_name, model_des, Options, constituent_array=None):
+    # A copy of the skeleton with everything but the parameter choices filled
+    # in. constituent_array names the ConstituentArray definition the model
+    # refers to, by default its own.
+    if constituent_array is None:
+        constituent_array = model_name+"ConstituentArray"
+    grammar_schema = copy.deepcopy(_rng_skeleton())
+    define_cons_element, define_model_element = grammar_schema[1], grammar_schema[2]
+    define_cons_element.set("name", constituent_array)
+
+    #Model definition
+    define_model_element.set("name", model_name+".model")
+    model_element = define_model_element[0]
+    type_a_documentation, type_value = model_element[0]
+    type_a_documentation.text = model_des
+    type_value.text = model_name
+    model_element[1][0].set("name", constituent_array)
+
+    #Parameter definition
+    interleave_element = define_model_element[1][0][1]
+    interleave_element[2].set("name", constituent_array)
+    _add_options(interleave_element, Options)
+    return grammar_schema
+
+def _add_parameters(define_model_element, Parameters):
+    type_choice = define_model_element[1][0][0][0]
+    for value, a_documentation in Parameters.items():
+        value_element = etree.SubElement(type_choice, 'value')
+        value_element.text = value
+        a_documentation_element = etree.SubElement(type_choice, etree.QName(ns_annotations, "documentation"))
+        a_documentation_element.text = a_documentation
+
+def _build_rng_schema(Model_name, Parameters, Options=None):
+    model_name, model_des = list(Model_name.items())[0]
+    grammar_schema = _model_grammar(model_name, model_des, Options)
+    _add_parameters(grammar_schema[2], Parameters)
+
     # Return the RNG schema tree
-    return schema_tree
+    return etree.ElementTree(grammar_schema)
+
+def _shared_definitions(constituent_array, chemical_groups, model_body, parameter_body):
+    # A copy of the skeleton with the ChemicalGroups element, the body of
+    # Model (its ConstituentArray and ChemicalGroups) and the body of Parameter
+    # (its text, Interval and ConstituentArray patterns) moved into their own
+    # definitions, named chemical_groups, model_body and parameter_body, and
+    # the model definition they were taken from, now referring to them.
+    grammar_schema = copy.deepcopy(_rng_skeleton())
+    define_cons_element, define_model_element = grammar_schema[1], grammar_schema[2]
+    define_cons_element.set("name", constituent_array)
+    grammar_schema.remove(define_model_element)
+
+    #ChemicalGroups definition
+    model_interleave_element = define_model_element[0][1]
+    model_interleave_element[0].set("name", constituent_array)
+    optional_element = model_interleave_element[1]
+    define_groups_element = etree.Element("define", name=chemical_groups)
+    define_groups_element.append(optional_element[0])
+    etree.SubElement(optional_element, 'ref', name=chemical_groups)
+
+    #Model body definition
+    define_model_body_element = etree.Element("define", name=model_body)
+    define_model_body_element.append(model_interleave_element)
+    etree.SubElement(define_model_element[0], 'ref', name=model_body)
+
+    #Parameter body definition
+    parameter_element = define_model_element[1][0]
+    interleave_element = parameter_element[1]
+    interleave_element[2].set("name", constituent_array)
+    define_body_element = etree.Element("define", name=parameter_body)
+    define_body_element.append(interleave_element)
+
+    define_cons_element.addnext(define_groups_element)
+    define_groups_element.addnext(define_model_body_element)
+    define_model_body_element.addnext(define_body_element)
+    return grammar_schema, define_model_element
+
+def generate_merged_rng_schema(models, constituent_array="CustomConstituentArray", chemical_groups="CustomChemicalGroups",
+                               model_body="CustomModelBody", parameter_body="CustomParameterBody"):
+    # One grammar for several custom models, given as (Model_name, Parameters,
+    # Options) like the arguments of generate_rng_schema. The ConstituentArray
+    # and ChemicalGroups structures and the bodies of Model and Parameter are
+    # defined once, as constituent_array, chemical_groups, model_body and
+    # parameter_body, and every model only adds a '<name>.model' definition
+    # with its Model type value, its parameter choice and its optional additions.
+    grammar_schema, model_template = _shared_definitions(constituent_array, chemical_groups, model_body, parameter_body)
+    comment = grammar_schema[-1]
+    model_names = set()
+    for Model_name, Parameters, Options in models:
+        model_name, model_des = list(Model_name.items())[0]
+        if model_name in model_names:
+            raise ValueError(f'Model {model_name} is defined more than once')
+        model_names.add(model_name)
+        define_model_element = copy.deepcopy(model_template)
+        define_model_element.set("name", model_name+".model")
+        type_a_documentation, type_value = define_model_element[0][0]
+        type_a_documentation.text = model_des
+        type_value.text = model_name
+        parameter_element = define_model_element[1][0]
+        if Options is None:
+            etree.SubElement(parameter_element, 'ref', name=parameter_body)
+        else:
+            interleave_element = etree.SubElement(parameter_element, 'interleave')
+            etree.SubElement(interleave_element, 'ref', name=parameter_body)
+            _add_options(interleave_element, Options)
+        _add_parameters(define_model_element, Parameters)
+        comment.addprevious(define_model_element)
+    return etree.ElementTree(grammar_schema)
 
 def save_rng_schema(schema_tree, filename):
     # Save the RNG schema to a file
@@ -127,10 +265,122 @@ def save_rng_schema(schema_tree, filename):
     with open(filename, "wb") as f:
         f.write(etree.tostring(schema_tree, encoding='utf-8', xml_declaration=True, pretty_print=True))
 
-def database_generator(configuration_file, output_file, print_schema=False):
-    Model_name, Parameters, Options=yaml_to_rng_input_strings(configuration_file)
-    schema_tree = generate_rng_schema(Model_name, Parameters, Options=Options)
-    if print_schema == True:
-        print('XML schema for custom model:\n', schema_tree)
-    save_rng_schema(schema_tree, output_file)
+def _write_element(xf, element, level, space):
+    # Write element and its children indented like etree.indent. Elements
+    # in a namespace are opened through xf so that they reuse the prefixes
+    # declared on the grammar instead of declaring their own.
+    if not isinstance(element.tag, str):
+        # Comments
+        xf.write(element)
+        return
+    if len(element) == 0 and not element.tag.startswith('{'):
+        # Written as a fresh element, which carries no namespace declarations
+        leaf = etree.Element(element.tag, dict(element.attrib))
+        leaf.text = element.text
+        xf.write(leaf)
+        return
+    with xf.element(element.tag, dict(element.attrib)):
+        if element.text:
+            xf.write(element.text)
+        for child in element:
+            xf.write('\n' + space*(level+1))
+            _write_element(xf, child, level+1, space)
+        if len(element):
+            xf.write('\n' + space*level)
+
+def stream_rng_schema(Model_name, Parameters, filename, Options=None, space="    "):
+    # Write the schema of generate_rng_schema + save_rng_schema element by
+    # element with lxml's incremental writer. Parameters may be any mapping
+    # or an iterable of (keyword, documentation) pairs; each parameter choice
+    # is written and dropped, so memory does not grow with their number.
+    model_name, model_des = list(Model_name.items())[0]
+    grammar_schema = _model_grammar(model_name, model_des, Options)
+    define_model_element = grammar_schema[2]
+    parameter_element = define_model_element[1][0]
+    if isinstance(Parameters, dict):
+        Parameters = Parameters.items()
+    parameters = iter(Parameters)
+    first_parameter = next(parameters, None)
+
+    with open(filename, 'wb') as f:
+        with etree.xmlfile(f, encoding='utf-8') as xf:
+            xf.write_declaration()
+            with xf.element(grammar_schema.tag, dict(grammar_schema.attrib), nsmap=grammar_schema.nsmap):
+                xf.write('\n' + space)
+                _write_element(xf, grammar_schema[0], 1, space)
+                xf.write('\n' + space)
+                _write_element(xf, grammar_schema[1], 1, space)
+                xf.write('\n' + space)
+                with xf.element(define_model_element.tag, dict(define_model_element.attrib)):
+                    xf.write('\n' + space*2)
+                    _write_element(xf, define_model_element[0], 2, space)
+                    xf.write('\n' + space*2)
+                    with xf.element('zeroOrMore'):
+                        xf.write('\n' + space*3)
+                        with xf.element('element', dict(parameter_element.attrib)):
+                            xf.write('\n' + space*4)
+                            with xf.element('attribute', dict(parameter_element[0].attrib)):
+                                xf.write('\n' + space*5)
+                                if first_parameter is None:
+                                    xf.write(etree.Element('choice'))
+                                else:
+                                    with xf.element('choice'):
+                                        for value, a_documentation in itertools.chain([first_parameter], parameters):
+                                            xf.write('\n' + space*6)
+                                            with xf.element('value'):
+                                                xf.write(value)
+                                            xf.write('\n' + space*6)
+                                            if a_documentation is None:
+                                                # Empty, as save_rng_schema writes it. Elements
+                                                # written by xf would declare the namespace again,
+                                                # so this one goes to the file directly.
+                                                xf.flush()
+                                                f.write(b'<a:documentation/>')
+                                                continue
+                                            with xf.element(etree.QName(ns_annotations, "documentation")):
+                                                if a_documentation:
+                                                    xf.write(a_documentation)
+                                        xf.write('\n' + space*5)
+                                xf.write('\n' + space*4)
+                            xf.write('\n' + space*4)
+                            _write_element(xf, parameter_element[1], 4, space)
+                            xf.write('\n' + space*3)
+                        xf.write('\n' + space*2)
+                    xf.write('\n' + space)
+                xf.write('\n' + space)
+                xf.write(grammar_schema[3])
+                xf.write('\n')
+        f.write(b'\n')
+
+def database_generator(configuration_file, output_file, print_schema=False, manifest=None, stream=False):
+    # With a BuildManifest, output_file is only rewritten when the database
+    # section or the generator version changed. Returns whether it was written.
+    # stream=True writes the schema with stream_rng_schema instead of building
+    # the whole tree in memory first.
+    if manifest is not None:
+        environment = environment_digest(__version__)
+        if manifest.unchanged_source(output_file, configuration_file, environment):
+            return False
+    setting = load_configuration(configuration_file)
+    if manifest is not None:
+        digest = section_digest(setting['database'], environment)
+        if manifest.is_current(output_file, digest):
+            manifest.record(output_file, configuration_file, environment, digest)
+            return False
+    Model_name, Parameters, Options=rng_inputs_from_setting(setting)
+    if stream and not print_schema:
+        stream_rng_schema(Model_name, Parameters, output_file, Options=Options)
+    else:
+        schema_tree = generate_rng_schema(Model_name, Parameters, Options=Options)
+        if print_schema == True:
+            print('XML schema for custom model:\n', schema_tree)
+        save_rng_schema(schema_tree, output_file)
+    if manifest is not None:
+        manifest.record(output_file, configuration_file, environment, digest)
+    return True
+
 
+def merged_database_generator(configuration_files, output_file):
+    # Write the merged schema of the database sections of configuration_files
+    models = [rng_inputs_from_setting(load_configuration(f)) for f in configuration_files]
+    save_rng_schema(generate_merged_rng_schema(models), output_file)
@@ -0,0 +1,139 @@
+from lxml import etree
+
+
+def _constituent_array(element, species):
+    # Tuple of sublattices in site id order (document order without ids), each
+    # a sorted tuple of constituents as in pycalphad's Database
+    sites = []
+    for position, site in enumerate(element.iterchildren('Site')):
+        site_id = site.get('id')
+        constituents = sorted(constituent.get('refid').upper() for constituent in site.iterchildren('Constituent'))
+        if species is not None:
+            constituents = [species(name) for name in constituents]
+        sites.append((int(site_id) if site_id is not None else position, tuple(constituents)))
+    sites.sort(key=lambda site: site[0])
+    return tuple(constituents for _, constituents in sites)
+
+
+def _parameter_record(element, phase_name, model_type, species):
+    constituent_array = ()
+    intervals = []
+    options = {}
+    for child in element:
+        if not isinstance(child.tag, str):
+            continue
+        if child.tag == 'ConstituentArray':
+            constituent_array = _constituent_array(child, species)
+        elif child.tag == 'Interval':
+            intervals.append((child.get('in'), child.get('lower'), child.get('upper'), (child.text or '').strip()))
+        else:
+            # Optional additions such as Exponents or Order, by tag
+            options[child.tag] = (child.text or '').strip() or None
+    value = (element.text or '').strip() or None
+    order = options.get('Order')
+    return {
+        'phase_name': phase_name,
+        'model': model_type,
+        'parameter_type': element.get('type'),
+        'constituent_array': constituent_array,
+        'parameter_order': int(order) if order is not None else 0,
+        'value': value,
+        'intervals': tuple(intervals),
+        'options': options,
+    }
+
+
+def _release(element):
+    # Drop element and everything parsed before it, so that the tree never
+    # holds more than the element being processed
+    element.clear(keep_tail=False)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def iter_parameters(database_file, species=None, keep=None):
+    # Yield one record per Parameter element of an XML database that follows
+    # the generated schemas, using iterparse and releasing elements as soon as
+    # they are processed. species, e.g. pycalphad.variables.Species, turns
+    # constituent names into the objects parameter functions compare against.
+    # keep(record) may reject records that are not needed.
+    # Records are dicts with the keys of pycalphad parameters that select them
+    # ('phase_name', 'parameter_type', 'constituent_array', 'parameter_order')
+    # plus 'model', 'value' (the Parameter text), 'intervals' as (variable,
+    # lower, upper, expression) tuples and 'options' (e.g. {'Exponents': '2'}).
+    # Expressions are kept as text; records have no 'parameter' key.
+    if species is not None:
+        # One object per constituent name, shared by all records
+        species_objects = {}
+        def species(name, make_species=species):
+            obj = species_objects.get(name)
+            if obj is None:
+                obj = species_objects[name] = make_species(name)
+            return obj
+    phase_name = None
+    model_type = None
+    for event, element in etree.iterparse(database_file, events=('start', 'end'),
+                                          tag=('Phase', 'Model', 'Parameter')):
+        if event == 'start':
+            if element.tag == 'Phase':
+                phase_name = (element.get('id') or '').upper()
+                model_type = None
+            continue
+        if element.tag == 'Model':
+            # Released together with the first parameter of the phase
+            model_type = element.get('type')
+            continue
+        if element.tag == 'Parameter':
+            record = _parameter_record(element, phase_name, model_type, species)
+            _release(element)
+            if keep is None or keep(record):
+                yield record
+        else:
+            _release(element)
+            phase_name = None
+
+
+class ParameterStore(object):
+    # Parameter records grouped by (phase_name, parameter_type), so that a
+    # lookup looks at the parameters of one phase and type only instead of
+    # scanning the whole database. It is queried by hand through find() and
+    # search(); it is not a Database, and the generated models do not read it.
+
+    def __init__(self, records=()):
+        self._groups = {}
+        self._length = 0
+        for record in records:
+            self.insert(record)
+
+    @classmethod
+    def from_xml(cls, database_file, species=None, keep=None):
+        return cls(iter_parameters(database_file, species=species, keep=keep))
+
+    def insert(self, record):
+        self._groups.setdefault((record['phase_name'], record['parameter_type']), []).append(record)
+        self._length += 1
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for records in self._groups.values():
+            yield from records
+
+    def phases(self):
+        return sorted({phase_name for phase_name, _ in self._groups})
+
+    def find(self, phase_name, parameter_type, test=None):
+        # Records of one phase and parameter type whose constituent array
+        # passes test, e.g. Model._array_validity
+        records = self._groups.get((phase_name, parameter_type), [])
+        if test is None:
+            return list(records)
+        return [record for record in records if test(record['constituent_array'])]
+
+    def search(self, query):
+        # Same interface as TinyDB's table search, e.g. for the param_query
+        # of a generated parameter function
+        return [record for record in self if query(record)]
@@ -0,0 +1,332 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+
+from cmgen.template_registry import TemplateRegistry, source_stat, write_binary_registry
+
+# Every template function is stored indented as a method of the generated class
+MEMBER_INDENT = '    '
+# Version of the extraction results; extraction caches of another version are discarded
+EXTRACTOR_VERSION = 2
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _reindent(lines, col_offset):
+    # Move a block of source lines from col_offset to the member indentation.
+    # Whitespace-only lines are kept as they are.
+    result = []
+    for line in lines:
+        if line.strip() == '':
+            result.append(line)
+        elif line[:col_offset].strip() == '':
+            result.append(MEMBER_INDENT + line[col_offset:])
+        else:
+            result.append(MEMBER_INDENT + line.lstrip())
+    return ''.join(result)
+
+
+def _function_nodes(tree):
+    # Module level functions and the methods of module level classes, in source order
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            yield node
+        elif isinstance(node, ast.ClassDef):
+            for member in node.body:
+                if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    yield member
+
+
+def _assigned_names(statement):
+    # Names a class body statement binds, in order
+    if isinstance(statement, ast.ClassDef):
+        return [statement.name]
+    targets = statement.targets if isinstance(statement, ast.Assign) else [getattr(statement, 'target', None)]
+    return [node.id for target in targets if target is not None
+            for node in ast.walk(target) if isinstance(node, ast.Name)]
+
+
+def _class_body_chunks(tree):
+    # Runs of class body statements between two methods of module level
+    # classes, e.g. the 'quantities' properties, as lists of statements in
+    # source order. 'contributions' is skipped: the generator writes it from
+    # the configuration.
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        chunk = []
+        for member in node.body:
+            if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if chunk:
+                    yield chunk
+                chunk = []
+            elif isinstance(member, ast.Expr) and isinstance(member.value, ast.Constant):
+                # Docstrings
+                continue
+            elif 'contributions' not in _assigned_names(member):
+                chunk.append(member)
+        if chunk:
+            yield chunk
+
+
+def _split_source(code):
+    # Return the imports of the module and (name, col_offset, source) of every
+    # function and class body chunk in source order. The source of a function
+    # includes its decorators, the source of a chunk the comment lines right
+    # above it; both span whole lines. A chunk is named after the first name
+    # it assigns.
+    tree = ast.parse(code)
+    lines = code.splitlines(True)
+    imports = [ast.get_source_segment(code, node) for node in tree.body
+               if isinstance(node, (ast.Import, ast.ImportFrom))]
+    entries = []
+    for node in _function_nodes(tree):
+        first_line = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+        entries.append((first_line, node.name, node.col_offset, node.end_lineno))
+    for chunk in _class_body_chunks(tree):
+        first_line = min([chunk[0].lineno] + [decorator.lineno for decorator in getattr(chunk[0], 'decorator_list', [])])
+        while first_line > 1 and lines[first_line-2].strip().startswith('#'):
+            first_line -= 1
+        entries.append((first_line, _assigned_names(chunk[0])[0], chunk[0].col_offset, chunk[-1].end_lineno))
+    entries.sort()
+    return imports, [(name, col_offset, ''.join(lines[first_line-1:end_line]).rstrip())
+                     for first_line, name, col_offset, end_line in entries]
+
+
+def function_entry(name, col_offset, source):
+    # The registry entry of one function, in the template_functions.json format
+    return {'name': name, 'content': '\n' + _reindent(source.splitlines(True), col_offset)}
+
+
+def _extract_functions(code, cache=None):
+    # extract_functions, also returning the cache keys of the entries
+    imports, functions = _split_source(code)
+    entries, keys = [], []
+    for name, col_offset, source in functions:
+        key = _digest(f'{col_offset}:{source}')
+        entry = cache.get_function(key) if cache is not None else None
+        if entry is None:
+            entry = function_entry(name, col_offset, source)
+            if cache is not None:
+                cache.set_function(key, entry)
+        entries.append(entry)
+        keys.append(key)
+    return imports, entries, keys
+
+
+def extract_functions(code, cache=None):
+    # Extract the template functions and imports from the source code of one
+    # module. Entries of functions whose source is unchanged are taken from cache.
+    imports, entries, _ = _extract_functions(code, cache=cache)
+    return imports, entries
+
+
+def _extract_file(args):
+    # Runs in a worker process. cached_functions only holds the cache entries
+    # of the functions filename had when it was last extracted; the entries of
+    # its current functions are sent back.
+    filename, code, cached_functions = args
+    cache = ExtractionCache(entries={'functions': cached_functions})
+    imports, entries, keys = _extract_functions(code, cache=cache)
+    return filename, imports, entries, {key: cache.get_function(key) for key in keys}
+
+
+class ExtractionCache(object):
+    # Extraction results keyed by the digest of each source file and of each
+    # function, so that re-extraction only processes what changed. The keys of
+    # the functions last extracted from each source file are kept as well.
+    # A cache file written by another EXTRACTOR_VERSION is ignored.
+
+    def __init__(self, filename=None, entries=None):
+        self.filename = filename
+        if entries is None and filename is not None and os.path.exists(filename):
+            with open(filename, 'r') as file:
+                entries = json.load(file)
+            if entries.get('version') != EXTRACTOR_VERSION:
+                entries = None
+        self.entries = {'version': EXTRACTOR_VERSION, 'files': {}, 'functions': {}, 'sources': {}}
+        self.entries.update(entries or {})
+
+    def get_file(self, digest):
+        return self.entries['files'].get(digest)
+
+    def set_file(self, digest, imports, entries):
+        self.entries['files'][digest] = {'imports': imports, 'functions': entries}
+
+    def get_function(self, digest):
+        return self.entries['functions'].get(digest)
+
+    def set_function(self, digest, entry):
+        self.entries['functions'][digest] = entry
+
+    def get_source(self, filename):
+        return self.entries['sources'].get(filename, [])
+
+    def set_source(self, filename, digests):
+        self.entries['sources'][filename] = digests
+
+    def save(self, filename=None):
+        filename = filename or self.filename
+        tmp_file = filename + '.tmp'
+        with open(tmp_file, 'w') as file:
+            json.dump(self.entries, file)
+        os.replace(tmp_file, filename)
+
+
+def extract_template_functions(source_files, cache=None, max_workers=None):
+    # Extract template functions from several Model-like source files.
+    # Files that are not in cache are parsed in parallel worker processes.
+    # Returns (imports, entries); for duplicated names the first file wins.
+    results = {}
+    pending = []
+    for filename in source_files:
+        with open(filename, 'r') as file:
+            code = file.read()
+        digest = _digest(code)
+        cached = cache.get_file(digest) if cache is not None else None
+        if cached is not None:
+            results[filename] = (cached['imports'], cached['functions'])
+        else:
+            pending.append((filename, code, digest))
+
+    def _store(filename, digest, imports, entries):
+        results[filename] = (imports, entries)
+        if cache is not None:
+            cache.set_file(digest, imports, entries)
+
+    def _cached_functions(filename):
+        if cache is None:
+            return {}
+        return {key: cache.get_function(key) for key in cache.get_source(filename)
+                if cache.get_function(key) is not None}
+
+    if len(pending) > 1 and max_workers != 1:
+        digests = {filename: digest for filename, _, digest in pending}
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            jobs = [(filename, code, _cached_functions(filename)) for filename, code, _ in pending]
+            for filename, imports, entries, functions in executor.map(_extract_file, jobs):
+                if cache is not None:
+                    cache.entries['functions'].update(functions)
+                    cache.set_source(filename, list(functions))
+                _store(filename, digests[filename], imports, entries)
+    else:
+        for filename, code, digest in pending:
+            imports, entries, keys = _extract_functions(code, cache=cache)
+            if cache is not None:
+                cache.set_source(filename, keys)
+            _store(filename, digest, imports, entries)
+
+    imports, entries, names = [], [], set()
+    for filename in source_files:
+        file_imports, file_entries = results[filename]
+        imports.extend(statement for statement in file_imports if statement not in imports)
+        for entry in file_entries:
+            if entry['name'] not in names:
+                names.add(entry['name'])
+                entries.append(entry)
+    return imports, entries
+
+
+def _binary_registry_source(binary_file):
+    # (digest, source) of a binary registry, None if it cannot be read
+    try:
+        registry = TemplateRegistry.from_binary(binary_file)
+    except (OSError, ValueError):
+        return None
+    return registry.digest, registry.source
+
+
+def _chunk_name(content):
+    # The name a class body chunk entry would be extracted under, None for functions
+    try:
+        tree = ast.parse(textwrap.dedent(content))
+    except SyntaxError:
+        return None
+    for statement in tree.body:
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return None
+        names = _assigned_names(statement)
+        if names:
+            return names[0]
+    return None
+
+
+def update_template_registry(registry_file, source_files, cache_file=None, max_workers=None, prune=False, binary_file=None):
+    # Refresh the template functions of registry_file (template_functions.json)
+    # from source_files. Entries of extracted functions and class body chunks
+    # are replaced in place and new ones are appended. Entries that are not
+    # extracted are kept unless prune is True.
+    # The imports of a new registry are the imports of the source files.
+    # The binary registry binary_file (by default the .bin next to
+    # registry_file, if there is one) is rebuilt whenever it is out of date.
+    # Returns a dict with the names of the added, changed and removed entries.
+    cache = ExtractionCache(cache_file) if cache_file is not None else None
+    imports, entries = extract_template_functions(source_files, cache=cache, max_workers=max_workers)
+    if os.path.exists(registry_file):
+        with open(registry_file, 'r') as file:
+            template_functions = json.load(file)
+    else:
+        template_functions = {'imports': '\n' + ''.join(statement + '\n' for statement in imports) + 'from pycalphad import Model\n',
+                              'functions': []}
+    extracted = {entry['name']: entry for entry in entries}
+    summary = {'added': [], 'changed': [], 'removed': []}
+    functions = []
+    for entry in template_functions['functions']:
+        new_entry = extracted.pop(entry['name'], None)
+        if new_entry is None:
+            # Class body chunks keep the name of their registry entry (e.g.
+            # 'quantities') when they still start by assigning the same name
+            first_name = _chunk_name(entry['content'])
+            if first_name is not None and first_name != entry['name'] and first_name in extracted:
+                new_entry = dict(extracted.pop(first_name), name=entry['name'])
+        if new_entry is None:
+            if prune:
+                summary['removed'].append(entry['name'])
+                continue
+            functions.append(entry)
+        else:
+            if new_entry['content'] != entry['content']:
+                summary['changed'].append(entry['name'])
+            functions.append(new_entry)
+    for name, entry in extracted.items():
+        summary['added'].append(name)
+        functions.append(entry)
+    template_functions['functions'] = functions
+    if any(summary.values()) or not os.path.exists(registry_file):
+        with open(registry_file, 'w') as file:
+            file.write(json.dumps(template_functions, indent=4))
+    if binary_file is None and os.path.exists(os.path.splitext(registry_file)[0] + '.bin'):
+        binary_file = os.path.splitext(registry_file)[0] + '.bin'
+    if binary_file is not None:
+        registry = TemplateRegistry.from_json(registry_file)
+        if _binary_registry_source(binary_file) != (registry.digest, source_stat(registry_file)):
+            write_binary_registry(registry, binary_file, source_file=registry_file)
+    if cache is not None:
+        cache.save()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m cmgen.extract', description='Extract template functions from Model-like source files into a template_functions.json registry.')
+    parser.add_argument('sources', nargs='+', help='Python source files to extract functions from')
+    parser.add_argument('-o', '--output', required=True, help='registry file to create or update')
+    parser.add_argument('--cache', default=None, help='extraction cache file')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--prune', action='store_true', help='remove registry entries that are not found in the sources')
+    parser.add_argument('--binary', default=None, help='binary registry to build (default: the .bin next to the output, if it exists)')
+    args = parser.parse_args(argv)
+    summary = update_template_registry(args.output, args.sources, cache_file=args.cache,
+                                       max_workers=args.jobs, prune=args.prune, binary_file=args.binary)
+    for key in ('added', 'changed', 'removed'):
+        print(f'{key}: {len(summary[key])}' + (f' ({", ".join(summary[key])})' if summary[key] else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
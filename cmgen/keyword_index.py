@@ -0,0 +1,90 @@
+import json
+import os
+
+from cmgen.config import load_configuration
+
+# Format version of keyword index files
+KEYWORD_INDEX_VERSION = 1
+
+
+def _arity(attributes):
+    # Number of arguments of a parameter function besides self and dbe
+    if attributes is None:
+        return 0
+    if isinstance(attributes, str):
+        return 1
+    return len(attributes)
+
+
+def keyword_entries(setting):
+    # (model_type, class_name, {keyword: [[function, arity], ...]}) of one
+    # configuration. model_type is the database name, i.e. the type of the
+    # Model elements in XML databases. Keywords of the database section that
+    # no parameter function consumes map to an empty list.
+    model_type = setting['database']['name']
+    keywords = {keyword: [] for keyword in setting['database']['parameters'] or {}}
+    for param in setting['model']['parameters_functions'] or []:
+        keyword = param['database_keyword']
+        if keyword is not None:
+            keywords.setdefault(keyword, []).append([param['parameter'], _arity(param['attributes'])])
+    return model_type, setting['model']['name'], keywords
+
+
+class KeywordIndex(object):
+    # Parameter keyword -> model type -> parameter functions consuming it, so
+    # that a parser routes each parameter with two dict lookups instead of
+    # testing it against every registered model.
+
+    def __init__(self, models=None, keywords=None):
+        # models: {model_type: class_name}
+        # keywords: {keyword: {model_type: [[function, arity], ...]}}
+        self.models = models or {}
+        self.keywords = keywords or {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        index = cls()
+        for setting in settings:
+            index.add(*keyword_entries(setting))
+        return index
+
+    @classmethod
+    def from_configuration_files(cls, configuration_files):
+        return cls.from_settings(load_configuration(f) for f in configuration_files)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'r') as file:
+            data = json.load(file)
+        if data.get('version') != KEYWORD_INDEX_VERSION:
+            raise ValueError(f'{filename}: unsupported keyword index version {data.get("version")}')
+        return cls(data['models'], data['keywords'])
+
+    def add(self, model_type, class_name, keywords):
+        if model_type in self.models:
+            raise ValueError(f'Model {model_type} is indexed more than once')
+        self.models[model_type] = class_name
+        for keyword, functions in keywords.items():
+            self.keywords.setdefault(keyword, {})[model_type] = functions
+
+    def route(self, keyword, model_type):
+        # [(function, arity), ...] of model_type consuming keyword, empty if none
+        return [tuple(function) for function in self.keywords.get(keyword, {}).get(model_type, ())]
+
+    def models_using(self, keyword):
+        # Model types whose database declares or consumes keyword
+        return list(self.keywords.get(keyword, {}))
+
+    def save(self, filename):
+        tmp_file = filename + '.tmp'
+        with open(tmp_file, 'w') as file:
+            json.dump({'version': KEYWORD_INDEX_VERSION, 'models': self.models, 'keywords': self.keywords},
+                      file, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp_file, filename)
+
+
+def keyword_index_generator(configuration_files, output_file):
+    # Write the keyword index of one or several configuration files
+    if isinstance(configuration_files, str):
+        configuration_files = [configuration_files]
+    KeywordIndex.from_configuration_files(configuration_files).save(output_file)
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+
+
+def environment_digest(*parts):
+    # Digest of everything besides the configuration that shapes a generated
+    # file, e.g. the generator version and the template registry digest.
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
+def section_digest(section, environment):
+    # Digest of one configuration section (e.g. setting['model']) together
+    # with the environment it is generated in.
+    payload = json.dumps([section, environment], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _file_stat(filename):
+    stat = os.stat(filename)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class BuildManifest(object):
+    # Record of the digest each output file was generated from, so that
+    # outputs whose inputs did not change can be left untouched.
+
+    def __init__(self, filename=None, entries=None):
+        self.filename = filename
+        if entries is None and filename is not None and os.path.exists(filename):
+            with open(filename, 'r') as file:
+                entries = json.load(file)
+        self.entries = dict(entries or {})
+
+    @staticmethod
+    def key(output_file):
+        return os.path.abspath(output_file)
+
+    def unchanged_source(self, output_file, configuration_file, environment):
+        # Cheap check that needs no parsing: the configuration file has the same
+        # mtime and size as last time and the environment did not change.
+        entry = self.entries.get(self.key(output_file))
+        if entry is None or not os.path.exists(output_file):
+            return False
+        return entry['environment'] == environment and entry['source'] == _file_stat(configuration_file)
+
+    def is_current(self, output_file, digest):
+        entry = self.entries.get(self.key(output_file))
+        if entry is None or not os.path.exists(output_file):
+            return False
+        return entry['digest'] == digest
+
+    def record(self, output_file, configuration_file, environment, digest):
+        self.entries[self.key(output_file)] = {
+            'digest': digest,
+            'environment': environment,
+            'source': _file_stat(configuration_file),
+        }
+
+    def save(self, filename=None):
+        filename = filename or self.filename
+        tmp_file = filename + '.tmp'
+        with open(tmp_file, 'w') as file:
+            json.dump(self.entries, file, indent=1, sort_keys=True)
+        os.replace(tmp_file, filename)
@@ -1,114 +1,264 @@
-import yaml
+import io
+import linecache
 import os
-import json
-
-def custom_model(model_name, contributions, basic_functions, parameter_functions, energy_functions):
-    # Create the class definition as a string
-    class_definition = f"class {model_name}(Model):\n"
-  
-    # Add contributions to the class definition
-    for contribution in contributions:
-        class_definition += f"    {contribution}\n"
-
-    # Add basic functions to the class definition
-    for basic_function in basic_functions:
-        class_definition += f"    {basic_function}\n"
-   
-    # Add parameter functions to the class definition
-    for method in parameter_functions:
-        class_definition += f"    {method}\n"
-  
-    for method in energy_functions:
-        class_definition += f"    {method}\n"
-    # Return the class definition
-    return class_definition
-
-
-def yaml_to_basic_functions_strings(setting):
-    function_strings = []
-    template_file=open('template_functions.json') ##To do: need to be more general.
-    template_functions=json.load(template_file)
+import textwrap
+from cmgen._version import __version__
+from cmgen.config import load_configuration
+from cmgen.manifest import environment_digest, section_digest
+from cmgen.template_registry import get_template_registry, used_names
+
+# Model classes built by model_class_generator, keyed by the digest of their model section
+_model_classes = {}
+# Digest of the model section of configuration files, keyed by (path, mtime, size, environment)
+_model_class_sources = {}
+
+def write_custom_model(sink, model_name, contributions, basic_functions, parameter_functions, energy_functions, module_functions=()):
+    # Write the class definition section by section into a file-like sink.
+    # The function arguments may be lazy iterables, so that only one function
+    # body is held in memory at a time.
+    # Module level helper functions used by the class are written first
+    for function in module_functions:
+        sink.write(function)
+        sink.write("\n")
+    sink.write(f"class {model_name}(Model):\n")
+
+    # Add contributions, basic functions, parameter functions and energy functions to the class definition
+    for section in (contributions, basic_functions, parameter_functions, energy_functions):
+        for method in section:
+            sink.write("    ")
+            sink.write(method)
+            sink.write("\n")
+
+
+def custom_model(model_name, contributions, basic_functions, parameter_functions, energy_functions, module_functions=()):
+    # Return the class definition as a string
+    buffer = io.StringIO()
+    write_custom_model(buffer, model_name, contributions, basic_functions, parameter_functions, energy_functions,
+                       module_functions=module_functions)
+    return buffer.getvalue()
+
+
+def template_function_names(setting, registry=None):
+    # Names of the template functions to emit for the basic_functions key, as
+    # (methods, module_functions). Listed names are emitted as given, followed
+    # by every template function the listed functions, the CEF-default energy
+    # functions and the parameter functions depend on, directly or
+    # transitively. 'default' lists nothing by itself and is kept for existing
+    # configurations, in which it used to be what added the dependencies;
+    # 'none' ends the list.
+    if registry is None:
+        registry = get_template_registry()
+    listed = []
     for key in setting['model']['basic_functions']:
         if key == 'none':
             break
-        if key == 'default':
-            for fun_name in ['__new__', '__init__', '__eq__', '__ne__', '__hash__' 'moles', 'ast', 'variables', 'degree_of_ordering', 'quantities', 'endmember_reference_model', 'get_internal_constraints', '_array_validity', '_purity_test', '_interaction_test', '_site_ratio_normalization', 'redlich_kister_sum', 'build_phase']:
-                for funs in template_functions['functions']:
-                    if funs['name'] == fun_name: 
-                        function_strings.append(funs['content']+'\n') 
-        else:
-            for funs in template_functions['functions']:
-                if funs['name'] == key:
-                    function_strings.append(funs['content']+'\n')
-    return function_strings
+        if key != 'default' and key in registry and key not in listed:
+            listed.append(key)
+    energy_names = [ene_f['energy'] for ene_f in setting['model']['energy_functions']
+                    if ene_f['function'] == 'CEF-default' and ene_f['energy'] in registry]
+    methods, module_functions = registry.dependency_closure(listed + energy_names, code=iter_parameter_functions_strings(setting))
+    methods = listed + [name for name in methods if name not in listed and name not in energy_names]
+    return methods, module_functions
 
 
-def yaml_to_parameter_functions_strings(setting):
-    function_strings = []
-    functions=[]
+def iter_basic_functions_strings(setting, registry=None, functions=None):
+    # functions is the result of template_function_names(), computed if not given
+    if registry is None:
+        registry = get_template_registry()
+    if functions is None:
+        functions = template_function_names(setting, registry=registry)
+    methods, _ = functions
+    for fun_name in methods:
+        yield registry[fun_name]+'\n'
+
 
+def yaml_to_basic_functions_strings(setting, registry=None):
+    return list(iter_basic_functions_strings(setting, registry=registry))
+
+
+def iter_module_functions_strings(setting, registry=None, functions=None):
+    # Template functions the class calls as plain module level functions
+    if registry is None:
+        registry = get_template_registry()
+    if functions is None:
+        functions = template_function_names(setting, registry=registry)
+    _, module_functions = functions
+    for fun_name in module_functions:
+        yield textwrap.dedent(registry[fun_name])+'\n'
+
+
+def iter_parameter_functions_strings(setting):
+    # Each string is indented by four more spaces when written into the class
     for param in setting['model']['parameters_functions']:
-        if param['attributes'] is not None:
-            def_string= f"def {param['parameter']}(self, dbe, {', '.join(param['attributes'])}):"
+        attributes = param['attributes']
+        if isinstance(attributes, str):
+            attributes = [attributes]
+        if attributes is not None:
+            def_string= f"def {param['parameter']}(self, dbe, {', '.join(attributes)}):"
         else:
             def_string= f"def {param['parameter']}(self, dbe):"
-        function_strings.append(def_string)
+        yield def_string
         if param['database_keyword'] is not None:
             keyword=param['database_keyword']
-            search_string= f'\tparam_query=(\n\t\t\t(where("phase_name") == self.phase_name) & \\\n\t\t\t(where("parameter_type") == "{keyword}") & \\\n\t\t\t(where("constituent_array").test(self._array_validity))\n\t\t)\n\t\tparams = dbe._parameters.search(param_query)'
-            function_strings.append(search_string)
+            search_string= f'    param_query=(\n            (where("phase_name") == self.phase_name) & \\\n            (where("parameter_type") == "{keyword}") & \\\n            (where("constituent_array").test(self._array_validity))\n        )\n        params = self._indexed_search(dbe, self.phase_name, "{keyword}")(param_query)'
+            yield search_string
         if param['comments'] is not None:
-            comments_string=f"\t#{param['comments']}"
-            function_strings.append(comments_string)
-        function_strings.append(f"\treturn {param['parameter']}\n")
-        functions.append(function_strings)
-    
-    return function_strings
-
-def yaml_to_energy_functions_strings(setting):
-    function_strings = []
-    template_file=open('template_functions.json') ##To do: need to be more general.
-    template_functions=json.load(template_file)
+            comments_string=f"    #{param['comments']}"
+            yield comments_string
+        yield f"    return {param['parameter']}\n"
+
+
+def yaml_to_parameter_functions_strings(setting):
+    return list(iter_parameter_functions_strings(setting))
+
+
+def iter_energy_functions_strings(setting, registry=None):
+    if registry is None:
+        registry = get_template_registry()
     for ene_f in setting['model']['energy_functions']:
         if ene_f['comments'] is not None:
             comments_string=ene_f['comments']
-            function_strings.append(f'#{comments_string}\n')
+            yield f'#{comments_string}\n'
         if ene_f['function'] == 'CEF-default':
-            print('Need to include redlich_kister_sum function')
-            for funs in template_functions['functions']:
-                if funs['name'] == ene_f['energy']:
-                    content_string=funs['content']
-                    function_strings.append(f'{content_string}\n')
+            if ene_f['energy'] in registry:
+                content_string=registry[ene_f['energy']]
+                yield f'{content_string}\n'
         else:
-            function_strings.append(f"\n    def {ene_f['energy']}(self, dbe):\n")
-            function_strings.append(f"\t{ene_f['function']}\n\t\treturn {ene_f['energy']}\n")
-    return function_strings
+            yield from _custom_energy_function_strings(ene_f)
 
 
-def process_model_information(yamlfile):
-    with open(yamlfile, 'r') as file:
-        setting=yaml.safe_load(file)
-    class_name=setting['model']['name']
-    #contribution
+def _custom_energy_function_strings(ene_f):
+    yield f"\n    def {ene_f['energy']}(self, dbe):"
+    body = str(ene_f['function']).splitlines() or ['None']
+    yield "    " + "\n        ".join(body) + f"\n        return {ene_f['energy']}\n"
+
+
+def yaml_to_energy_functions_strings(setting, registry=None):
+    return list(iter_energy_functions_strings(setting, registry=registry))
+
+
+def contributions_strings(setting):
     energy_contributions=setting['model']['energy_contributions']
     en_cons = [f'\t("{{key}}", "{{value}}")'.format(key=key, value=value) for key, value in energy_contributions.items()]
-    energy_contributions_result_string = ["contributions = [\n{}\n\t]".format(",\n".join(en_cons))]
+    return ["contributions = [\n{}\n\t]".format(",\n".join(en_cons))]
+
+
+def model_import_header(setting, registry=None, functions=None):
+    # Only import what the emitted code uses. Heavy modules needed by a single
+    # template function (e.g. pycalphad.io.tdb in unwrap_piecewise) are already
+    # imported inside that function and never appear here.
+    # The names read by template functions are looked up in the registry, only
+    # the code written from the configuration is parsed here.
+    if registry is None:
+        registry = get_template_registry()
+    if functions is None:
+        functions = template_function_names(setting, registry=registry)
+    methods, module_functions = functions
+    names = {'Model'}
+    template_names = methods + module_functions
+    for ene_f in setting['model']['energy_functions']:
+        if ene_f['function'] == 'CEF-default':
+            if ene_f['energy'] in registry:
+                template_names.append(ene_f['energy'])
+        else:
+            for code in _custom_energy_function_strings(ene_f):
+                names |= used_names(code)
+    for name in template_names:
+        names |= registry.used_names(name)
+    for section in (contributions_strings(setting), iter_parameter_functions_strings(setting)):
+        for code in section:
+            names |= used_names(code)
+    return registry.import_header(names)
+
+
+def model_information_from_setting(setting, registry=None, lazy=False, functions=None):
+    # With lazy=True the function sections are returned as iterators for write_custom_model
+    class_name=setting['model']['name']
+    #contribution
+    energy_contributions_result_string = contributions_strings(setting)
     #basic functions
-    basic_function_strings=yaml_to_basic_functions_strings(setting)
+    basic_function_strings=iter_basic_functions_strings(setting, registry=registry, functions=functions)
     #parameter functions
-    parameter_function_strings=yaml_to_parameter_functions_strings(setting)
+    parameter_function_strings=iter_parameter_functions_strings(setting)
     #energy functions
-    energy_function_strings=yaml_to_energy_functions_strings(setting)
+    energy_function_strings=iter_energy_functions_strings(setting, registry=registry)
+    if not lazy:
+        basic_function_strings=list(basic_function_strings)
+        parameter_function_strings=list(parameter_function_strings)
+        energy_function_strings=list(energy_function_strings)
     return class_name, energy_contributions_result_string, basic_function_strings, parameter_function_strings, energy_function_strings
 
-def model_generator(configuration_file, output_file, print_model=False):
-    class_name, contributions, basic_functions, parameter_functions, energy_functions = process_model_information(configuration_file)
-    dynamic_class_code = custom_model(class_name, contributions, basic_functions, parameter_functions, energy_functions)
-    if print_model == True:
-        print('Custom model template is:\n', dynamic_class_code)
+def process_model_information(yamlfile, registry=None):
+    return model_information_from_setting(load_configuration(yamlfile), registry=registry)
+
+def model_generator(configuration_file, output_file, print_model=False, template_file=None, manifest=None):
+    # template_file selects another template registry (.json or .bin); the packaged one is used by default
+    # With a BuildManifest, output_file is only rewritten when the model section,
+    # the template registry or the generator version changed. Returns whether it was written.
+    registry = get_template_registry(template_file)
+    if manifest is not None:
+        environment = environment_digest(__version__, registry.digest)
+        if manifest.unchanged_source(output_file, configuration_file, environment):
+            return False
+    setting = load_configuration(configuration_file)
+    if manifest is not None:
+        digest = section_digest(setting['model'], environment)
+        if manifest.is_current(output_file, digest):
+            manifest.record(output_file, configuration_file, environment, digest)
+            return False
+    # The emitted template functions are resolved once for all sections
+    functions = template_function_names(setting, registry=registry)
+    model_information = model_information_from_setting(setting, registry=registry, lazy=not print_model, functions=functions)
+    module_functions = iter_module_functions_strings(setting, registry=registry, functions=functions)
     with open(output_file, "w") as py_file:
-        f=open('./template_functions.json')
-        temps=json.load(f)
-        py_file.write(temps['imports']+'\n')
-        py_file.write(dynamic_class_code)
+        py_file.write(model_import_header(setting, registry=registry, functions=functions)+'\n')
+        if print_model == True:
+            dynamic_class_code = custom_model(*model_information, module_functions=module_functions)
+            print('Custom model template is:\n', dynamic_class_code)
+            py_file.write(dynamic_class_code)
+        else:
+            write_custom_model(py_file, *model_information, module_functions=module_functions)
+    if manifest is not None:
+        manifest.record(output_file, configuration_file, environment, digest)
+    return True
+
+
+def _compile_model_class(setting, registry, digest):
+    functions = template_function_names(setting, registry=registry)
+    buffer = io.StringIO()
+    buffer.write(model_import_header(setting, registry=registry, functions=functions)+'\n')
+    write_custom_model(buffer, *model_information_from_setting(setting, registry=registry, lazy=True, functions=functions),
+                       module_functions=iter_module_functions_strings(setting, registry=registry, functions=functions))
+    source = buffer.getvalue()
+    class_name = setting['model']['name']
+    # Register the source so tracebacks and inspect can show the generated code
+    filename = f'<cmgen model {class_name} {digest[:12]}>'
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    namespace = {'__name__': f'cmgen_generated_{class_name}'}
+    exec(compile(source, filename, 'exec'), namespace)
+    return namespace[class_name]
+
 
+def model_class_generator(configuration, template_file=None):
+    # Return the custom Model subclass described by configuration, a yaml file
+    # or an already parsed setting dict, without writing a module to disk.
+    # Classes are compiled once and cached by the digest of the model section,
+    # the template registry and the generator version. Repeated requests for an
+    # unchanged configuration file return the cached class after a stat call.
+    registry = get_template_registry(template_file)
+    environment = environment_digest(__version__, registry.digest)
+    if isinstance(configuration, dict):
+        setting = configuration
+        digest = section_digest(setting['model'], environment)
+    else:
+        stat = os.stat(configuration)
+        source_key = (os.path.abspath(configuration), stat.st_mtime_ns, stat.st_size, environment)
+        digest = _model_class_sources.get(source_key)
+        if digest in _model_classes:
+            return _model_classes[digest]
+        setting = load_configuration(configuration)
+        digest = _model_class_sources[source_key] = section_digest(setting['model'], environment)
+    model_class = _model_classes.get(digest)
+    if model_class is None:
+        model_class = _model_classes[digest] = _compile_model_class(setting, registry, digest)
+    return model_class
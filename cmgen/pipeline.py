@@ -0,0 +1,31 @@
+import os
+from cmgen.model_generator import model_generator
+from cmgen.database_generator import database_generator
+from cmgen.keyword_index import keyword_index_generator
+
+
+def default_output_files(configuration_file, output_dir=None):
+    # Model .py and schema .rng named after the configuration file
+    stem, _ = os.path.splitext(os.path.basename(configuration_file))
+    if output_dir is None:
+        output_dir = os.path.dirname(configuration_file)
+    return os.path.join(output_dir, stem+'.py'), os.path.join(output_dir, stem+'.rng')
+
+
+def generate_all(configuration_file, model_output_file=None, schema_output_file=None, output_dir=None,
+                 print_model=False, print_schema=False, template_file=None, manifest=None, keyword_index_file=None):
+    # Generate both the model template and the XML database schema from one
+    # configuration file. The file is parsed once: both generators read it
+    # through load_configuration, which keeps the parsed result for later calls.
+    # keyword_index_file, if given, receives the parameter keyword index.
+    # Returns whether the model and the schema files were written.
+    default_model_file, default_schema_file = default_output_files(configuration_file, output_dir)
+    model_output_file = model_output_file or default_model_file
+    schema_output_file = schema_output_file or default_schema_file
+    model_written = model_generator(configuration_file, model_output_file, print_model=print_model,
+                                    template_file=template_file, manifest=manifest)
+    schema_written = database_generator(configuration_file, schema_output_file, print_schema=print_schema,
+                                        manifest=manifest)
+    if keyword_index_file is not None:
+        keyword_index_generator(configuration_file, keyword_index_file)
+    return model_written, schema_written
@@ -1,5 +1,7 @@
 import copy
+import hashlib
 import warnings
+import weakref
 from symengine import exp, log, Abs, Add, And, Float, Mul, Piecewise, Pow, S, sin, StrictGreaterThan, Symbol, zoo, oo
 from tinydb import where
 import pycalphad.variables as v
@@ -8,8 +10,7 @@ from pycalphad.core.constants import MIN_SITE_FRACTION
 from pycalphad.core.utils import unpack_components, get_pure_elements, wrap_symbol
 import numpy as np
 from collections import OrderedDict
-
-_MAX_PARAM_NESTING = 32
+from pycalphad.model import classproperty
 
 
 def _toop_filter(chemical_group_dict, symmetric_species, asymmetric_species):
@@ -55,6 +56,13 @@ class Model(object):
                      ('2st', 'twostate_energy'), ('ein', 'einstein_energy'),
                      ('vol', 'volume_energy'), ('ord', 'atomic_ordering_energy')]
 
+    # Data derived from each Database and shared by all models built from it,
+    # see _database_cache. Keyed by id(dbe).
+    _database_caches = {}
+
+    # Passes of symbol_replace over symbols that refer to other symbols
+    _max_param_nesting = 32
+
     # Behave as if piecewise temperature bounds extend to +-inf (i.e., ignore lower/upper T limits for parameters)
     # This follows the behavior of most commercial codes, but may be undesirable in some circumstances
     # Designed to be readonly on instances, because mutation after initialization will not work
@@ -142,22 +150,24 @@ class Model(object):
         self.pure_elements = sorted(set(desired_active_pure_elements))
         self.nonvacant_elements = [x for x in self.pure_elements if x != 'VA']
 
-        # Convert string symbol names to Symbol objects
-        # This makes xreplace work with the symbols dict
-        symbols = {Symbol(s): val for s, val in dbe.symbols.items()}
-
         if parameters is not None:
             self._parameters_arg = parameters
+            # Convert string symbol names to Symbol objects
+            # This makes xreplace work with the symbols dict
+            symbols = {Symbol(s): val for s, val in dbe.symbols.items()}
             if isinstance(parameters, dict):
                 symbols.update([(wrap_symbol(s), val) for s, val in parameters.items()])
             else:
                 # Lists of symbols that should remain symbolic
                 for s in parameters:
                     symbols.pop(wrap_symbol(s))
+            symbols = self._resolve_symbols({wrap_symbol(key): value for key, value in symbols.items()})
         else:
             self._parameters_arg = None
+            # Resolved once per Database, see _database_symbols
+            symbols = self._database_symbols(dbe)
 
-        self._symbols = {wrap_symbol(key): value for key, value in symbols.items()}
+        self._symbols = symbols
 
         self.models = OrderedDict()
         self.build_phase(dbe)
@@ -166,8 +176,10 @@ class Model(object):
             # XXX: xreplace hack because SymEngine seems to let Symbols slip in somehow
             self.models[name] = self.symbol_replace(value, symbols).xreplace(v.supported_variables_in_databases)
 
-        self.site_fractions = sorted([x for x in self.variables if isinstance(x, v.SiteFraction)], key=str)
-        self.state_variables = sorted([x for x in self.variables if not isinstance(x, v.SiteFraction)], key=str)
+        # variables is already sorted
+        variables = self.variables
+        self.site_fractions = [x for x in variables if isinstance(x, v.SiteFraction)]
+        self.state_variables = [x for x in variables if not isinstance(x, v.SiteFraction)]
 
     @classmethod
     def unwrap_piecewise(cls, graph):
@@ -208,6 +220,54 @@ class Model(object):
                 replace_dict[atom] = Piecewise(*exprcondpairs)
         return graph.xreplace(replace_dict)
 
+    @classmethod
+    def _resolve_symbols(cls, symbols):
+        
+        #Return a copy of symbols in which no value refers to another key of symbols.
+        #Each value is substituted once, after the values it refers to, and its
+        #piecewise functions are unwrapped as in symbol_replace. Values in a
+        #reference cycle keep referring to each other.
+        
+        resolved = {}
+        visiting = set()
+        for root in symbols:
+            stack = [(root, False)]
+            while stack:
+                key, expanded = stack.pop()
+                if key in resolved or (not expanded and key in visiting):
+                    continue
+                value = symbols[key]
+                free_symbols = getattr(value, 'free_symbols', ())
+                if not expanded:
+                    visiting.add(key)
+                    stack.append((key, True))
+                    stack.extend((x, False) for x in free_symbols
+                                 if x in symbols and x not in resolved and x not in visiting)
+                    continue
+                visiting.discard(key)
+                try:
+                    value = value.xreplace({x: resolved[x] for x in free_symbols if x in resolved})
+                    value = cls.unwrap_piecewise(value)
+                except AttributeError:
+                    # Can't use xreplace on a float
+                    pass
+                resolved[key] = value
+        return resolved
+
+    @classmethod
+    def _database_symbols(cls, dbe):
+        
+        #Return the resolved symbols (see _resolve_symbols) of dbe, keyed by Symbol.
+        #They are computed once per Database and again only when dbe.symbols changes.
+        
+        cache = cls._database_cache(dbe)
+        key = ('symbols', bool(cls.extrapolate_temperature_bounds))
+        entry = cache.get(key)
+        if entry is None or entry[0] != dbe.symbols:
+            source = dict(dbe.symbols)
+            entry = cache[key] = (source, cls._resolve_symbols({Symbol(s): val for s, val in source.items()}))
+        return entry[1]
+
     @classmethod
     def symbol_replace(cls, obj, symbols):
         """
@@ -225,11 +285,13 @@ class Model(object):
         try:
             # Need to do more substitutions to catch symbols that are functions
             # of other symbols
-            for iteration in range(_MAX_PARAM_NESTING):
+            for iteration in range(cls._max_param_nesting):
                 obj = obj.xreplace(symbols)
                 obj = cls.unwrap_piecewise(obj)
                 undefs = [x for x in obj.free_symbols if not isinstance(x, v.StateVariable)]
-                if len(undefs) == 0:
+                # Symbols left undefined by symbols need no more passes,
+                # one pass is enough with resolved symbols
+                if not any(x in symbols for x in undefs):
                     break
         except AttributeError:
             # Can't use xreplace on a float
@@ -242,13 +304,41 @@ class Model(object):
         elif type(self) != type(other):
             return False
         else:
-            return self.__dict__ == other.__dict__
+            return self.fingerprint == other.fingerprint
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(repr(self))
+        return hash(self.fingerprint)
+
+    @property
+    def fingerprint(self):
+        "Return a digest of the class, phase, components, parameters and contributions of the model."
+        return self._memoized('fingerprint', self._structure_digest)
+
+    def _structure_digest(self):
+        
+        #Return the sha256 hex digest behind fingerprint. It only depends on the
+        #structure of the model, so it is the same in every process. Attributes
+        #added after the build, e.g. by shift_reference_state, are not part of it.
+        
+        if isinstance(self._parameters_arg, dict):
+            parameters = sorted((str(key), str(value)) for key, value in self._parameters_arg.items())
+        elif self._parameters_arg is not None:
+            parameters = sorted(str(key) for key in self._parameters_arg)
+        else:
+            parameters = None
+        structure = (
+            type(self).__module__ + '.' + type(self).__qualname__,
+            self.phase_name,
+            [str(site_ratio) for site_ratio in self.site_ratios],
+            [sorted(str(constituent) for constituent in sublattice) for sublattice in self.constituents],
+            sorted(str(component) for component in self.components),
+            parameters,
+            [(name, str(value)) for name, value in self.models.items()],
+        )
+        return hashlib.sha256(repr(structure).encode('utf-8')).hexdigest()
 
     def moles(self, species, per_formula_unit=False):
         "Number of moles of species or elements."
@@ -284,12 +374,17 @@ class Model(object):
     @property
     def ast(self):
         "Return the full abstract syntax tree of the model."
-        return Add(*list(self.models.values()))
+        return self._memoized('ast', lambda: Add(*list(self.models.values())))
 
     @property
     def variables(self):
         "Return state variables in the model."
-        return sorted([x for x in self.ast.free_symbols if isinstance(x, v.StateVariable)], key=str)
+        return list(self._memoized('variables', lambda: tuple(sorted([x for x in self.ast.free_symbols if isinstance(x, v.StateVariable)], key=str))))
+
+    @property
+    def variable_index(self):
+        "Return a dict mapping each state variable of the model to its position in variables."
+        return self._memoized('variable_index', lambda: {x: idx for idx, x in enumerate(self.variables)})
 
     @property
     def degree_of_ordering(self):
@@ -324,16 +419,22 @@ class Model(object):
 
     #pylint: disable=C0103
     # These are standard abbreviations from Thermo-Calc for these quantities
-    energy = GM = property(lambda self: self.ast)
-    formulaenergy = G = property(lambda self: self.ast * self._site_ratio_normalization)
-    entropy = SM = property(lambda self: -self.GM.diff(v.T))
-    enthalpy = HM = property(lambda self: self.GM - v.T*self.GM.diff(v.T))
-    heat_capacity = CPM = property(lambda self: -v.T*self.GM.diff(v.T, v.T))
+    # They are memoized until self.models changes, see _memoized
+    energy = GM = property(lambda self: self._memoized('GM', lambda: self.ast))
+    formulaenergy = G = property(lambda self: self._memoized('G', lambda: self.GM * self._site_ratio_normalization))
+    # First and second temperature derivatives of GM and GM_MIX
+    _GM_T = property(lambda self: self._memoized('GM_T', lambda: self.GM.diff(v.T)))
+    _GM_TT = property(lambda self: self._memoized('GM_TT', lambda: self._GM_T.diff(v.T)))
+    entropy = SM = property(lambda self: self._memoized('SM', lambda: -self._GM_T))
+    enthalpy = HM = property(lambda self: self._memoized('HM', lambda: self.GM - v.T*self._GM_T))
+    heat_capacity = CPM = property(lambda self: self._memoized('CPM', lambda: -v.T*self._GM_TT))
     #pylint: enable=C0103
-    mixing_energy = GM_MIX = property(lambda self: self.GM - self.endmember_reference_model.GM)
-    mixing_enthalpy = HM_MIX = property(lambda self: self.GM_MIX - v.T*self.GM_MIX.diff(v.T))
-    mixing_entropy = SM_MIX = property(lambda self: -self.GM_MIX.diff(v.T))
-    mixing_heat_capacity = CPM_MIX = property(lambda self: -v.T*self.GM_MIX.diff(v.T, v.T))
+    mixing_energy = GM_MIX = property(lambda self: self._memoized('GM_MIX', lambda: self.GM - self.endmember_reference_model.GM, self.endmember_reference_model))
+    _GM_MIX_T = property(lambda self: self._memoized('GM_MIX_T', lambda: self.GM_MIX.diff(v.T), self.endmember_reference_model))
+    _GM_MIX_TT = property(lambda self: self._memoized('GM_MIX_TT', lambda: self._GM_MIX_T.diff(v.T), self.endmember_reference_model))
+    mixing_enthalpy = HM_MIX = property(lambda self: self._memoized('HM_MIX', lambda: self.GM_MIX - v.T*self._GM_MIX_T, self.endmember_reference_model))
+    mixing_entropy = SM_MIX = property(lambda self: self._memoized('SM_MIX', lambda: -self._GM_MIX_T, self.endmember_reference_model))
+    mixing_heat_capacity = CPM_MIX = property(lambda self: self._memoized('CPM_MIX', lambda: -v.T*self._GM_MIX_TT, self.endmember_reference_model))
 
     @property
     def endmember_reference_model(self):
@@ -341,8 +442,7 @@ class Model(object):
         #Return a Model containing only energy contributions from endmembers.
 
         if self._endmember_reference_model is None:
-            endmember_only_dbe = copy.deepcopy(self._dbe)
-            endmember_only_dbe._parameters.remove(where('constituent_array').test(self._interaction_test))
+            endmember_only_dbe = self._parameter_view(self._dbe, lambda param: not self._interaction_test(param['constituent_array']))
             mod_endmember_only = self.__class__(endmember_only_dbe, self.components, self.phase_name, parameters=self._parameters_arg)
             # Ideal mixing contributions are always generated, so we need to set the
             # contribution of the endmember reference model to zero to preserve ideal
@@ -403,9 +503,162 @@ class Model(object):
         for key, value in self.__class__.contributions:
             self.models[key] = S(getattr(self, value)(dbe))
 
+    @classmethod
+    def _database_cache(cls, dbe):
+        
+        #Return the dict of data derived from dbe, e.g. its parameter index.
+        #It is kept outside of dbe, because Database equality and hashing
+        #depend on its attributes, and is dropped when dbe is garbage collected.
+        
+        caches = cls._database_caches
+        key = id(dbe)
+        entry = caches.get(key)
+        if entry is None or entry[0]() is not dbe:
+            def _drop(ref, key=key):
+                if key in caches and caches[key][0] is ref:
+                    del caches[key]
+            entry = caches[key] = (weakref.ref(dbe, _drop), {})
+        return entry[1]
+
+    @classmethod
+    def _parameter_index(cls, dbe):
+        
+        #Return the parameters of dbe grouped by (phase_name, parameter_type).
+        #The index is built once per Database and rebuilt when parameters are
+        #inserted, updated or removed: TinyDB writes a new table dict on each
+        #of these, so the index is keyed by the table it was built from.
+        
+        cache = cls._database_cache(dbe)
+        index = cache.get('parameters')
+        parameters = dbe._parameters
+        read_table = getattr(parameters, '_read_table', None)
+        table = read_table() if read_table is not None else parameters
+        if index is None or index[0] is not table:
+            groups = {}
+            for param in parameters.all():
+                groups.setdefault((param['phase_name'], param['parameter_type']), []).append(param)
+            index = cache['parameters'] = (table, groups)
+            cache.pop('constituent_arrays', None)
+        return index[1]
+
+    class _ParameterTable(object):
+        # Read-only stand-in for the parameter table of a Database, see
+        # _parameter_view. It holds references to the parameters of another
+        # Database and answers the same queries as its TinyDB table.
+
+        def __init__(self, params):
+            self._params = params
+
+        def __len__(self):
+            return len(self._params)
+
+        def all(self):
+            return list(self._params)
+
+        def search(self, query):
+            return [param for param in self._params if query(param)]
+
+    @classmethod
+    def _parameter_view(cls, dbe, keep):
+        
+        #Return a Database sharing everything with dbe but its parameters, which
+        #are the parameters of dbe for which keep(param) is True. Nothing is
+        #copied: the view holds references to the parameters of dbe in a
+        #read-only _ParameterTable, so dbe.search, dbe._parameters and
+        #_parameter_index all see the same parameters. The resolved symbols of
+        #dbe are reused.
+        
+        view = object.__new__(type(dbe))
+        view.__dict__.update(dbe.__dict__)
+        view._parameters = cls._ParameterTable([param for param in dbe._parameters.all() if keep(param)])
+        cache = cls._database_cache(view)
+        cache.update((key, value) for key, value in cls._database_cache(dbe).items()
+                     if isinstance(key, tuple) and key[0] == 'symbols')
+        return view
+
+    @classmethod
+    def _constituent_array_index(cls, dbe):
+        
+        #Return the parameters of dbe grouped by (phase_name, parameter_type, constituent_array),
+        #derived from _parameter_index and rebuilt with it.
+        
+        groups = cls._parameter_index(dbe)
+        cache = cls._database_cache(dbe)
+        index = cache.get('constituent_arrays')
+        if index is None:
+            index = cache['constituent_arrays'] = {}
+            for (phase_name, parameter_type), params in groups.items():
+                for param in params:
+                    key = (phase_name, parameter_type, cls._constituent_array_key(param['constituent_array']))
+                    index.setdefault(key, []).append(param)
+        return index
+
+    def _indexed_search(self, dbe, phase_name, *parameter_types):
+        
+        #Return a replacement for dbe.search that only applies queries to the
+        #parameters of phase_name with one of parameter_types. The queries
+        #must not match any other phase or parameter type.
+        
+        index = self._parameter_index(dbe)
+        candidates = [param for parameter_type in parameter_types
+                      for param in index.get((phase_name, parameter_type), ())]
+        def param_search(query):
+            return [param for param in candidates if query(param)]
+        return param_search
+
+    def _model_cache(self, name):
+        
+        #Return the dict memoizing name for this model. All such dicts live in
+        #self._caches, which does not take part in model comparisons.
+        
+        caches = self.__dict__.get('_caches')
+        if caches is None:
+            caches = self._caches = {}
+        cache = caches.get(name)
+        if cache is None:
+            cache = caches[name] = {}
+        return cache
+
+    def _memoized(self, name, compute, *models):
+        
+        #Return compute(), memoized under name until self.models or the models
+        #attribute of one of models, e.g. the endmember reference model, is
+        #reassigned or mutated.
+        
+        state = tuple(tuple(mod.models.items()) for mod in (self,) + models)
+        cache = self._model_cache('_memoized')
+        entry = cache.get(name)
+        if entry is None or entry[0] != state:
+            entry = cache[name] = (state, compute())
+        return entry[1]
+
+    @staticmethod
+    def _constituent_array_key(constituent_array):
+        
+        #Return a hashable form of constituent_array. Parameters of a Database
+        #already hold tuples of tuples, which are returned as they are.
+        
+        try:
+            hash(constituent_array)
+            return constituent_array
+        except TypeError:
+            return tuple(tuple(sublattice) for sublattice in constituent_array)
+
     def _array_validity(self, constituent_array):
         
         #Return True if the constituent_array contains only active species of the current Model instance.
+        #Results are memoized per constituent array, see _check_array_validity.
+        
+        constituent_array = self._constituent_array_key(constituent_array)
+        cache = self._model_cache('_array_validity')
+        valid = cache.get(constituent_array)
+        if valid is None:
+            valid = cache[constituent_array] = self._check_array_validity(constituent_array)
+        return valid
+
+    def _check_array_validity(self, constituent_array):
+        
+        #Uncached implementation of _array_validity.
         
         if len(constituent_array) != len(self.constituents):
             # Allow an exception for the ionic liquid model, where neutral
@@ -428,18 +681,26 @@ class Model(object):
         #Return True if the constituent_array is valid and has exactly one
         #species in every sublattice.
         
-        if not self._array_validity(constituent_array):
-            return False
-        return not any(len(sublattice) != 1 for sublattice in constituent_array)
+        constituent_array = self._constituent_array_key(constituent_array)
+        cache = self._model_cache('_purity_test')
+        pure = cache.get(constituent_array)
+        if pure is None:
+            pure = cache[constituent_array] = self._array_validity(constituent_array) and \
+                not any(len(sublattice) != 1 for sublattice in constituent_array)
+        return pure
 
     def _interaction_test(self, constituent_array):
         
         #Return True if the constituent_array is valid and has more than one
         #species in at least one sublattice.
         
-        if not self._array_validity(constituent_array):
-            return False
-        return any([len(sublattice) > 1 for sublattice in constituent_array])
+        constituent_array = self._constituent_array_key(constituent_array)
+        cache = self._model_cache('_interaction_test')
+        interaction = cache.get(constituent_array)
+        if interaction is None:
+            interaction = cache[constituent_array] = self._array_validity(constituent_array) and \
+                any(len(sublattice) > 1 for sublattice in constituent_array)
+        return interaction
 
     @property
     def _site_ratio_normalization(self):
@@ -520,7 +781,7 @@ class Model(object):
             (where("parameter_type") == "QKT") &
             (where('constituent_array').test(self._array_validity))
         )
-        param_search = dbe.search
+        param_search = self._indexed_search(dbe, phase.name, "QKT")
 
         params = param_search(param_query)
         kohler_toop_xs = S.Zero
@@ -556,6 +817,45 @@ class Model(object):
         return kohler_toop_xs
 
 
+    def _implicit_ternary_parameters(self, params):
+        
+        #Return params followed by the parameters they imply.
+        #NOTE: The commercial software packages seem to have
+        #a "feature" where, if only the zeroth
+        #parameter_order term of a ternary parameter is specified,
+        #the other two terms are automatically generated in order
+        #to make the parameter symmetric.
+        #In other words, specifying only this parameter:
+        #PARAMETER G(FCC_A1,AL,CR,NI;0) 298.15  +30300; 6000 N !
+        #Actually implies:
+        #PARAMETER G(FCC_A1,AL,CR,NI;0) 298.15  +30300; 6000 N !
+        #PARAMETER G(FCC_A1,AL,CR,NI;1) 298.15  +30300; 6000 N !
+        #PARAMETER G(FCC_A1,AL,CR,NI;2) 298.15  +30300; 6000 N !
+        #
+        #If either 1 or 2 is specified, no implicit parameters are
+        #generated. The other orders are looked up in the parameters of
+        #the Database grouped by constituent array.
+        
+        implied = []
+        index = None
+        for param in params:
+            if param['parameter_order'] != 0 or not any(len(comps) == 3 for comps in param['constituent_array']):
+                continue
+            if index is None:
+                index = self._constituent_array_index(self._dbe)
+            # are _any_ of the other parameter_orders specified?
+            key = (param['phase_name'], param['parameter_type'], self._constituent_array_key(param['constituent_array']))
+            other_tern_params = index.get(key, ())
+            if len(other_tern_params) == 1 and other_tern_params[0] == param:
+                # only the current parameter is specified
+                # We need to generate the other two parameters.
+                order_one = copy.copy(param)
+                order_one['parameter_order'] = 1
+                order_two = copy.copy(param)
+                order_two['parameter_order'] = 2
+                implied.extend((order_one, order_two))
+        return params + implied if implied else params
+
     def redlich_kister_sum(self, phase, param_search, param_query):
         
         #Construct parameter in Redlich-Kister polynomial basis, using
@@ -564,7 +864,7 @@ class Model(object):
         rk_terms = []
 
         # search for desired parameters
-        params = param_search(param_query)
+        params = self._implicit_ternary_parameters(param_search(param_query))
         for param in params:
             # iterate over every sublattice
             mixing_term = S.One
@@ -624,43 +924,8 @@ class Model(object):
                         comp_symbols[1], param['parameter_order'])
                 if len(comps) == 3:
                     # 'parameter_order' is an index to a variable when
-                    # we are in the ternary interaction parameter case
-
-                    # NOTE: The commercial software packages seem to have
-                    # a "feature" where, if only the zeroth
-                    # parameter_order term of a ternary parameter is specified,
-                    # the other two terms are automatically generated in order
-                    # to make the parameter symmetric.
-                    # In other words, specifying only this parameter:
-                    # PARAMETER G(FCC_A1,AL,CR,NI;0) 298.15  +30300; 6000 N !
-                    # Actually implies:
-                    # PARAMETER G(FCC_A1,AL,CR,NI;0) 298.15  +30300; 6000 N !
-                    # PARAMETER G(FCC_A1,AL,CR,NI;1) 298.15  +30300; 6000 N !
-                    # PARAMETER G(FCC_A1,AL,CR,NI;2) 298.15  +30300; 6000 N !
-                    #
-                    # If either 1 or 2 is specified, no implicit parameters are
-                    # generated.
-                    # We need to handle this case.
-                    if param['parameter_order'] == 0:
-                        # are _any_ of the other parameter_orders specified?
-                        ternary_param_query = (
-                            (where('phase_name') == param['phase_name']) & \
-                            (where('parameter_type') == \
-                                param['parameter_type']) & \
-                            (where('constituent_array') == \
-                                param['constituent_array'])
-                        )
-                        other_tern_params = param_search(ternary_param_query)
-                        if len(other_tern_params) == 1 and \
-                            other_tern_params[0] == param:
-                            # only the current parameter is specified
-                            # We need to generate the other two parameters.
-                            order_one = copy.copy(param)
-                            order_one['parameter_order'] = 1
-                            order_two = copy.copy(param)
-                            order_two['parameter_order'] = 2
-                            # Add these parameters to our iteration.
-                            params.extend((order_one, order_two))
+                    # we are in the ternary interaction parameter case,
+                    # see _implicit_ternary_parameters.
                     # Include variable indicated by parameter order index
                     # Perform Muggianu adjustment to site fractions
                     mixing_term *= comp_symbols[param['parameter_order']].subs(
@@ -708,7 +973,7 @@ class Model(object):
             (where('constituent_array').test(self._purity_test))
         )
         phase = dbe.phases[self.phase_name]
-        param_search = dbe.search
+        param_search = self._indexed_search(dbe, self.phase_name, "G")
         pure_energy_term = self.redlich_kister_sum(phase, param_search,
                                                    pure_param_query)
         return pure_energy_term / self._site_ratio_normalization
@@ -746,7 +1011,7 @@ class Model(object):
         #where m is the arity of the interaction parameter
         
         phase = dbe.phases[self.phase_name]
-        param_search = dbe.search
+        param_search = self._indexed_search(dbe, self.phase_name, 'G', 'L')
         param_query = (
             (where('phase_name') == self.phase_name) & \
                 ((where('parameter_type') == 'G') |
@@ -765,7 +1030,7 @@ class Model(object):
         #The approach follows from the background of W. Xiong et al, Calphad, 2012.
         
         phase = dbe.phases[self.phase_name]
-        param_search = dbe.search
+        param_search = self._indexed_search(dbe, phase.name, 'BMAGN', 'TC')
         self.TC = self.curie_temperature = S.Zero
         self.BMAG = self.beta = S.Zero
         if 'ihj_magnetic_structure_factor' not in phase.model_hints:
@@ -846,7 +1111,7 @@ class Model(object):
         #The approach follows W. Xiong et al, Calphad, 2012.
         
         phase = dbe.phases[self.phase_name]
-        param_search = dbe.search
+        param_search = self._indexed_search(dbe, phase.name, 'NT', 'BMAGN', 'TC')
         self.TC = self.curie_temperature = S.Zero
         if 'ihj_magnetic_structure_factor' not in phase.model_hints:
             return S.Zero
@@ -925,7 +1190,7 @@ class Model(object):
         #Return the energy from liquid-amorphous two-state model.
         
         phase = dbe.phases[self.phase_name]
-        param_search = dbe.search
+        param_search = self._indexed_search(dbe, phase.name, 'GD')
         site_ratio_normalization = self._site_ratio_normalization
         gd_param_query = (
             (where('phase_name') == phase.name) & \
@@ -945,7 +1210,7 @@ class Model(object):
         #then exp() is called on the result.
         
         phase = dbe.phases[self.phase_name]
-        param_search = dbe.search
+        param_search = self._indexed_search(dbe, phase.name, 'THETA')
         theta_param_query = (
             (where('phase_name') == phase.name) & \
             (where('parameter_type') == 'THETA') & \
@@ -1152,6 +1417,78 @@ class Model(object):
         return ordering_energy
 
     # TODO: fix case for VA interactions: L(PHASE,A,VA:VA;0)-type parameters
+    @classmethod
+    def _pure_element_view(cls, dbe):
+        
+        #Return a view of dbe (see _parameter_view) keeping the parameters in which
+        #every sublattice holds one constituent and exactly one constituent is an
+        #element other than VA, i.e. the parameters of pure element reference
+        #models. It is built once per Database and again when its parameters or
+        #symbols change. The cache entry also holds the reference models built on
+        #the view, see _pure_element_reference.
+        
+        signature = (cls._parameter_index(dbe), cls._database_symbols(dbe))
+        cache = cls._database_cache(dbe)
+        entry = cache.get('pure_elements')
+        if entry is None or any(old is not new for old, new in zip(entry[0], signature)):
+            elements = set(dbe.elements) - {'VA'}
+            def _pure_element_test(param):
+                all_comps = set()
+                for sublattice in param['constituent_array']:
+                    if len(sublattice) != 1:
+                        return False
+                    all_comps.add(sublattice[0].name)
+                return len(all_comps.intersection(elements)) == 1
+            entry = cache['pure_elements'] = (signature, cls._parameter_view(dbe, _pure_element_test), {})
+        return entry[1]
+
+    def _pure_element_reference(self, dbe, ref_state, contrib_mods, output):
+        
+        #Return {out: value} of the pure element reference model of ref_state for
+        #each out of output, with the fixed state variables of ref_state substituted.
+        #Unless this model was built with a parameters argument, reference models
+        #and their outputs are shared by all models of this class built from dbe.
+        
+        endmember_only_dbe = self._pure_element_view(dbe)
+        fixed_statevars = ref_state.fixed_statevars
+        key = None
+        if self._parameters_arg is None:
+            try:
+                key = (self.__class__, ref_state.species, ref_state.phase_name, tuple(contrib_mods.items()))
+                hash(key)
+            except TypeError:
+                key = None
+        if key is not None:
+            # Kept in the cache of dbe rather than of the view: the models refer
+            # to the view, which would then never be garbage collected
+            reference_models = self._database_cache(dbe)['pure_elements'][2]
+            entry = reference_models.get(key)
+        else:
+            entry = None
+        if entry is None:
+            mod_pure = self.__class__(endmember_only_dbe, [ref_state.species, v.Species('VA')], ref_state.phase_name, parameters=self._parameters_arg)
+            # apply the modifications to the Models
+            for contrib, new_val in contrib_mods.items():
+                mod_pure.models[contrib] = new_val
+            # set all the free site fractions to one, this should effectively delete any mixing terms spuriously added, e.g. idmix
+            site_frac_subs = {sf: 1 for sf in mod_pure.ast.free_symbols if isinstance(sf, v.SiteFraction)}
+            for mod_key, mod_val in mod_pure.models.items():
+                mod_pure.models[mod_key] = self.symbol_replace(mod_val, site_frac_subs)
+            entry = (mod_pure, {})
+            if key is not None:
+                reference_models[key] = entry
+        mod_pure, outputs = entry
+        statevars_key = tuple(sorted(fixed_statevars.items(), key=lambda item: str(item[0])))
+        reference_outputs = {}
+        for out in output:
+            mod_out = outputs.get((out, statevars_key))
+            if mod_out is None:
+                # get the output property of interest, substitute the fixed state variables (e.g. T=298.15)
+                # substitution of fixed state variables has to happen after getting the attribute in case there are any derivatives involving that state variable
+                mod_out = outputs[(out, statevars_key)] = self.symbol_replace(getattr(mod_pure, out), fixed_statevars)
+            reference_outputs[out] = mod_out
+        return reference_outputs
+
     def shift_reference_state(self, reference_states, dbe, contrib_mods=None, output=('GM', 'HM', 'SM', 'CPM'), fmt_str="{}R"):
         
         #Add new attributes for calculating properties w.r.t. an arbitrary pure element reference state.
@@ -1187,36 +1524,15 @@ class Model(object):
 
         contrib_mods = contrib_mods or {}
 
-        def _pure_element_test(constituent_array):
-            all_comps = set()
-            for sublattice in constituent_array:
-                if len(sublattice) != 1:
-                    return False
-                all_comps.add(sublattice[0].name)
-            pure_els = all_comps.intersection(model_pure_elements)
-            return len(pure_els) == 1
-
-        # Remove interactions from a copy of the Database, avoids any element/VA interactions.
-        endmember_only_dbe = copy.deepcopy(dbe)
-        endmember_only_dbe._parameters.remove(~where('constituent_array').test(_pure_element_test))
         reference_dict = {out: [] for out in output}  # output: terms list
         for ref_state in reference_states:
             if ref_state.species not in self.components:
                 continue
-            mod_pure = self.__class__(endmember_only_dbe, [ref_state.species, v.Species('VA')], ref_state.phase_name, parameters=self._parameters_arg)
-            # apply the modifications to the Models
-            for contrib, new_val in contrib_mods.items():
-                mod_pure.models[contrib] = new_val
-            # set all the free site fractions to one, this should effectively delete any mixing terms spuriously added, e.g. idmix
-            site_frac_subs = {sf: 1 for sf in mod_pure.ast.free_symbols if isinstance(sf, v.SiteFraction)}
-            for mod_key, mod_val in mod_pure.models.items():
-                mod_pure.models[mod_key] = self.symbol_replace(mod_val, site_frac_subs)
+            reference_outputs = self._pure_element_reference(dbe, ref_state, contrib_mods, output)
             moles = self.moles(ref_state.species)
-            # get the output property of interest, substitute the fixed state variables (e.g. T=298.15) and add the pure element moles weighted term to the list of terms
-            # substitution of fixed state variables has to happen after getting the attribute in case there are any derivatives involving that state variable
+            # add the pure element moles weighted term to the list of terms
             for out in reference_dict.keys():
-                mod_out = self.symbol_replace(getattr(mod_pure, out), ref_state.fixed_statevars)
-                reference_dict[out].append(mod_out*moles)
+                reference_dict[out].append(reference_outputs[out]*moles)
 
         # set the attribute on the class
         for out, terms in reference_dict.items():
@@ -1236,7 +1552,7 @@ class Model(object):
 
 
         phase = dbe.phases[self.phase_name]
-        param_search = dbe.search
+        param_search = self._indexed_search(dbe, phase.name, 'V0', 'VA', 'VK', 'VC')
 
         V0_param_query = (
             (where('phase_name') == phase.name) & \
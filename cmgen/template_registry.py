@@ -0,0 +1,360 @@
+import ast
+import hashlib
+import io
+import json
+import mmap
+import os
+import re
+import struct
+import textwrap
+from collections.abc import Mapping
+
+TEMPLATE_FUNCTIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'template_functions', 'template_functions.json')
+# Precompiled form of TEMPLATE_FUNCTIONS_FILE, see write_binary_registry()
+TEMPLATE_REGISTRY_FILE = os.path.splitext(TEMPLATE_FUNCTIONS_FILE)[0] + '.bin'
+
+# Binary registry layout: magic, header length as little-endian uint32, a
+# UTF-8 JSON header and the UTF-8 function bodies the header points into.
+BINARY_MAGIC = b'CMGREG1\n'
+_HEADER_LENGTH = struct.Struct('<I')
+
+# Registries already loaded in this process, keyed by absolute file path
+_registries = {}
+
+
+def _attribute_owner(node):
+    # 'self' or 'cls' for self.name, cls.name and self.__class__.name
+    owner = node.value
+    if isinstance(owner, ast.Attribute) and owner.attr == '__class__':
+        owner = owner.value
+    if isinstance(owner, ast.Name):
+        return owner.id
+    return None
+
+
+def _local_names(function):
+    # Arguments, assigned names and nested definitions of a function
+    names = set()
+    for node in ast.walk(function):
+        if isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node is not function:
+            names.add(node.name)
+    return names
+
+
+def referenced_names(code):
+    # Return (class_names, module_names): the names code reads from the class
+    # (self.name, cls.name or bare names in the class body) and the names its
+    # functions read from module scope.
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except SyntaxError:
+        # Generated stubs are not always valid Python, fall back to a textual scan
+        return set(re.findall(r'\b(?:self|cls)\.(\w+)', code)), set(re.findall(r'(?<![\w.])(\w+)\s*\(', code))
+    class_names, module_names = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Load) and _attribute_owner(node) in ('self', 'cls'):
+            class_names.add(node.attr)
+    for statement in tree.body:
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            local_names = _local_names(statement)
+            module_names.update(node.id for node in ast.walk(statement)
+                                if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in local_names)
+        else:
+            class_names.update(node.id for node in ast.walk(statement)
+                               if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load))
+    return class_names, module_names
+
+
+def source_stat(filename):
+    # (size, modification time in ns) of filename, recorded in a binary registry
+    # to tell cheaply whether the JSON it was built from changed since
+    stat = os.stat(filename)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def used_names(code):
+    # Every bare name code reads, e.g. to decide which imports it needs
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except SyntaxError:
+        # Generated stubs are not always valid Python, fall back to a textual scan
+        return set(re.findall(r'(?<![\w.])[A-Za-z_]\w*', code))
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+class _MappedFunctions(Mapping):
+    # Function bodies of a binary registry, decoded from the memory map on first access
+
+    def __init__(self, buffer, body_start, index):
+        self._buffer = buffer
+        self._body_start = body_start
+        self._index = index
+        self._decoded = {}
+
+    def __getitem__(self, name):
+        content = self._decoded.get(name)
+        if content is None:
+            offset, length = self._index[name]
+            start = self._body_start + offset
+            content = self._decoded[name] = self._buffer[start:start+length].decode('utf-8')
+        return content
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+class TemplateRegistry(object):
+    # Template functions indexed by name, together with the import block
+    # every generated model module starts with.
+
+    def __init__(self, imports, functions, digest=None, references=None, class_attributes=None, names=None,
+                 source=None):
+        self.imports = imports
+        # Identifies the registry contents, e.g. for build manifests
+        self.digest = digest
+        # source_stat() of the JSON a binary registry was built from, if known
+        self.source = source
+        if isinstance(functions, Mapping):
+            self._functions = functions
+        else:
+            self._functions = {}
+            for funs in functions:
+                # Keep the first definition if a name appears more than once
+                self._functions.setdefault(funs['name'], funs['content'])
+        # Call graph, filled in lazily by references() unless precomputed
+        self._references = dict(references or {})
+        # Bare names read by each entry, see used_names()
+        self._used_names = dict(names or {})
+        self._class_attributes = class_attributes
+        self._import_statements = None
+
+    @classmethod
+    def from_json(cls, filename):
+        with open(filename, 'rb') as file:
+            data = file.read()
+        template_functions = json.loads(data)
+        return cls(template_functions['imports'], template_functions['functions'],
+                   digest=hashlib.sha256(data).hexdigest())
+
+    @classmethod
+    def from_binary(cls, filename):
+        # Only the header is parsed here; function bodies are decoded from the
+        # memory map when they are first looked up.
+        with open(filename, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            buffer.close()
+            raise ValueError(f'{filename} is not a binary template registry')
+        header_start = len(BINARY_MAGIC) + _HEADER_LENGTH.size
+        header_length, = _HEADER_LENGTH.unpack_from(buffer, len(BINARY_MAGIC))
+        header = json.loads(buffer[header_start:header_start+header_length])
+        index = {name: (offset, length) for name, offset, length in header['index']}
+        references = {name: (set(methods), set(module_functions))
+                      for name, (methods, module_functions) in header['references'].items()}
+        names = {name: set(used) for name, used in header.get('used_names', {}).items()}
+        return cls(header['imports'], _MappedFunctions(buffer, header_start+header_length, index),
+                   digest=header['digest'], references=references,
+                   class_attributes=header['class_attributes'], names=names,
+                   source=tuple(header['source']) if header.get('source') else None)
+
+    @classmethod
+    def load(cls, filename):
+        # Binary or JSON registry, told apart by the magic bytes
+        with open(filename, 'rb') as file:
+            magic = file.read(len(BINARY_MAGIC))
+        if magic == BINARY_MAGIC:
+            return cls.from_binary(filename)
+        return cls.from_json(filename)
+
+    def __contains__(self, name):
+        return name in self._functions
+
+    def __getitem__(self, name):
+        return self._functions[name]
+
+    def __len__(self):
+        return len(self._functions)
+
+    def get(self, name, default=None):
+        return self._functions.get(name, default)
+
+    def names(self):
+        return list(self._functions.keys())
+
+    def _parsed_imports(self):
+        # [(module, [(name, asname)]), ...] for the statements of the imports
+        # block in order; module is None for plain 'import name' statements.
+        if self._import_statements is None:
+            statements = []
+            for node in ast.parse(self.imports).body:
+                aliases = [(alias.name, alias.asname) for alias in node.names]
+                if isinstance(node, ast.ImportFrom):
+                    statements.append(('.'*node.level + (node.module or ''), aliases))
+                elif isinstance(node, ast.Import):
+                    statements.append((None, aliases))
+            self._import_statements = statements
+        return self._import_statements
+
+    def import_header(self, names):
+        # The imports block reduced to the statements binding one of names
+        lines = []
+        for module, aliases in self._parsed_imports():
+            kept = []
+            for name, asname in aliases:
+                bound = asname or (name if module is not None else name.split('.')[0])
+                if bound in names:
+                    kept.append(f'{name} as {asname}' if asname else name)
+            if len(kept) == 0:
+                continue
+            if module is None:
+                lines.extend(f'import {alias}' for alias in kept)
+            else:
+                lines.append(f'from {module} import {", ".join(kept)}')
+        return '\n' + ''.join(line+'\n' for line in lines)
+
+    def _class_attribute_owners(self):
+        # Entries that are not functions (e.g. 'quantities') are chunks of class
+        # body statements; map the attributes they assign to the entry name.
+        if self._class_attributes is None:
+            owners = {}
+            for name, content in self._functions.items():
+                if content.lstrip().startswith(('def ', '@', 'async def ')):
+                    continue
+                for statement in ast.parse(textwrap.dedent(content)).body:
+                    if isinstance(statement, ast.ClassDef):
+                        # Nested classes, their own attributes are not class attributes
+                        owners.setdefault(statement.name, name)
+                        continue
+                    for node in ast.walk(statement):
+                        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                            owners.setdefault(node.id, name)
+            self._class_attributes = owners
+        return self._class_attributes
+
+    def resolve(self, class_names, module_names):
+        # Map names read by some code to the registry entries providing them.
+        # Returns (methods, module_functions) as sets of entry names.
+        owners = self._class_attribute_owners()
+        methods = set()
+        for name in class_names:
+            if name in self._functions:
+                methods.add(name)
+            elif name in owners:
+                methods.add(owners[name])
+        module_functions = {name for name in module_names if name in self._functions}
+        return methods, module_functions
+
+    def references(self, name):
+        # Direct dependencies of the template function name, see resolve()
+        refs = self._references.get(name)
+        if refs is None:
+            refs = self._references[name] = self.resolve(*referenced_names(self._functions[name]))
+        return refs
+
+    def used_names(self, name):
+        # Bare names the template function name reads, see used_names()
+        names = self._used_names.get(name)
+        if names is None:
+            names = self._used_names[name] = used_names(self._functions[name])
+        return names
+
+    def dependency_closure(self, roots, code=()):
+        # Transitive dependencies of the template functions roots and of the
+        # extra code snippets, including the roots themselves.
+        # Returns (methods, module_functions) as lists in registry order.
+        methods, module_functions = set(), set()
+        stack = [name for name in roots if name in self._functions]
+        methods.update(stack)
+        for snippet in code:
+            snippet_methods, snippet_module_functions = self.resolve(*referenced_names(snippet))
+            stack.extend(snippet_methods - methods)
+            methods.update(snippet_methods)
+            stack.extend(snippet_module_functions - module_functions)
+            module_functions.update(snippet_module_functions)
+        seen = set(stack)
+        while stack:
+            dep_methods, dep_module_functions = self.references(stack.pop())
+            for dep in dep_methods | dep_module_functions:
+                if dep not in seen:
+                    seen.add(dep)
+                    stack.append(dep)
+            methods.update(dep_methods)
+            module_functions.update(dep_module_functions)
+        methods -= module_functions
+        return ([name for name in self._functions if name in methods],
+                [name for name in self._functions if name in module_functions])
+
+
+def write_binary_registry(registry, filename, source_file=None):
+    # Write registry in the binary format read by TemplateRegistry.from_binary.
+    # The header carries the imports, the name -> (offset, length) index of the
+    # bodies, the precomputed call graph and the names each body reads, so that
+    # pruning and import selection never decode a body that is not emitted. The digest is kept from the source registry so
+    # build manifests do not depend on the format the registry was loaded from.
+    # source_file is the JSON registry was read from; its source_stat() lets
+    # get_template_registry check the binary registry without reading the JSON.
+    bodies = io.BytesIO()
+    index = []
+    for name in registry.names():
+        body = registry[name].encode('utf-8')
+        index.append([name, bodies.tell(), len(body)])
+        bodies.write(body)
+    references = {}
+    names = {}
+    for name in registry.names():
+        methods, module_functions = registry.references(name)
+        references[name] = [sorted(methods), sorted(module_functions)]
+        names[name] = sorted(registry.used_names(name))
+    header = json.dumps({'digest': registry.digest, 'imports': registry.imports, 'index': index,
+                         'references': references, 'used_names': names,
+                         'source': source_stat(source_file) if source_file is not None else None,
+                         'class_attributes': registry._class_attribute_owners()}).encode('utf-8')
+    tmp_file = filename + '.tmp'
+    with open(tmp_file, 'wb') as file:
+        file.write(BINARY_MAGIC)
+        file.write(_HEADER_LENGTH.pack(len(header)))
+        file.write(header)
+        file.write(bodies.getvalue())
+    os.replace(tmp_file, filename)
+
+
+def _default_template_registry():
+    # The precompiled registry, unless template_functions.json was edited
+    # since it was built. The .bin header records the size and modification
+    # time of the JSON it was built from, and its digest; the JSON is only
+    # read when the former changed, e.g. after a checkout.
+    # python -m cmgen.extract rebuilds it.
+    if os.path.exists(TEMPLATE_REGISTRY_FILE):
+        registry = TemplateRegistry.from_binary(TEMPLATE_REGISTRY_FILE)
+        if not os.path.exists(TEMPLATE_FUNCTIONS_FILE) or registry.source == source_stat(TEMPLATE_FUNCTIONS_FILE):
+            return registry
+        with open(TEMPLATE_FUNCTIONS_FILE, 'rb') as file:
+            if hashlib.sha256(file.read()).hexdigest() == registry.digest:
+                return registry
+    return TemplateRegistry.from_json(TEMPLATE_FUNCTIONS_FILE)
+
+
+def get_template_registry(template_file=None):
+    # Load template_file once per process and reuse it afterwards.
+    # Defaults to the precompiled registry shipped with cmgen, or to
+    # template_functions.json when it is missing or out of date.
+    if template_file is None:
+        registry = _registries.get(TEMPLATE_FUNCTIONS_FILE)
+        if registry is None:
+            registry = _registries[TEMPLATE_FUNCTIONS_FILE] = _default_template_registry()
+        return registry
+    template_file = os.path.abspath(template_file)
+    registry = _registries.get(template_file)
+    if registry is None:
+        registry = _registries[template_file] = TemplateRegistry.load(template_file)
+    return registry
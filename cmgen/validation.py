@@ -0,0 +1,147 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+# Local stand-in for the core.rng every generated schema includes
+CORE_SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas', 'core.rng')
+RNG_NS = "http://relaxng.org/ns/structure/1.0"
+
+# Compiled validators, keyed by the (path, mtime, size) of the schema files they were built from
+_validators = {}
+# Validator of the current worker process, see _init_worker
+_worker_validator = None
+
+
+def _schema_key(schema_files, core_schema):
+    key = []
+    for filename in (core_schema,) + tuple(schema_files):
+        stat = os.stat(filename)
+        key.append((os.path.abspath(filename), stat.st_mtime_ns, stat.st_size))
+    return tuple(key)
+
+
+def validation_grammar(schema_files, core_schema=None):
+    # One grammar made of the definitions of the generated schema_files, with
+    # their include of core.rng replaced by a single include of core_schema.
+    # Every '<name>.model' definition is added to the choice of models a
+    # phase may hold, so databases of several custom models validate at once.
+    # Optional additions that are still placeholders (an element without a
+    # pattern) are validated as empty elements.
+    if core_schema is None:
+        core_schema = CORE_SCHEMA_FILE
+    grammar = etree.Element(etree.QName(RNG_NS, 'grammar'), nsmap={None: RNG_NS})
+    grammar.set('datatypeLibrary', "http://www.w3.org/2001/XMLSchema-datatypes")
+    etree.SubElement(grammar, etree.QName(RNG_NS, 'include'), href=os.path.abspath(core_schema))
+    model_choice = etree.SubElement(grammar, etree.QName(RNG_NS, 'define'), name='model', combine='choice')
+    choice = etree.SubElement(model_choice, etree.QName(RNG_NS, 'choice'))
+    for schema_file in schema_files:
+        schema_dir = os.path.dirname(os.path.abspath(schema_file))
+        root = etree.parse(schema_file).getroot()
+        for element in root.iter(etree.QName(RNG_NS, 'element')):
+            if element.get('name') is not None and not any(isinstance(node.tag, str) for node in element):
+                etree.SubElement(element, etree.QName(RNG_NS, 'empty'))
+        for child in root:
+            if child.tag == etree.QName(RNG_NS, 'include'):
+                href = child.get('href')
+                if os.path.basename(href) == 'core.rng':
+                    continue
+                child.set('href', os.path.join(schema_dir, href))
+            elif child.tag == etree.QName(RNG_NS, 'define') and child.get('name', '').endswith('.model'):
+                etree.SubElement(choice, etree.QName(RNG_NS, 'ref'), name=child.get('name'))
+            grammar.append(child)
+    if len(choice) == 0:
+        model_choice.remove(choice)
+        etree.SubElement(model_choice, etree.QName(RNG_NS, 'notAllowed'))
+    return etree.ElementTree(grammar)
+
+
+def get_validator(schema_files, core_schema=None):
+    # The compiled etree.RelaxNG of schema_files. It is built once per process
+    # and rebuilt only when one of the schema files changes.
+    if isinstance(schema_files, str):
+        schema_files = [schema_files]
+    if core_schema is None:
+        core_schema = CORE_SCHEMA_FILE
+    key = _schema_key(schema_files, core_schema)
+    validator = _validators.get(key)
+    if validator is None:
+        validator = _validators[key] = etree.RelaxNG(validation_grammar(schema_files, core_schema=core_schema))
+    return validator
+
+
+def validate_file(database_file, validator):
+    # Return the list of error messages of database_file, empty when it is valid
+    try:
+        document = etree.parse(database_file)
+    except (OSError, etree.XMLSyntaxError) as e:
+        return [f'{type(e).__name__}: {e}']
+    if validator.validate(document):
+        return []
+    return [f'{error.line}:{error.column}: {error.message}' for error in validator.error_log]
+
+
+def _init_worker(schema_files, core_schema):
+    # Compiled validators cannot be pickled, each worker compiles its own once
+    global _worker_validator
+    _worker_validator = get_validator(schema_files, core_schema=core_schema)
+
+
+def _validate_one(database_file):
+    start = time.perf_counter()
+    errors = validate_file(database_file, _worker_validator)
+    return database_file, time.perf_counter() - start, errors
+
+
+def validate_files(database_files, schema_files, core_schema=None, jobs=None, report=print):
+    # Validate XML databases against the generated schema_files in a process
+    # pool and report one line per file. Returns the list of
+    # (database_file, seconds, errors).
+    if isinstance(schema_files, str):
+        schema_files = [schema_files]
+    jobs = jobs or os.cpu_count() or 1
+    # Fail early, in this process, if the schemas do not compile
+    get_validator(schema_files, core_schema=core_schema)
+    results = []
+    start = time.perf_counter()
+    if jobs == 1 or len(database_files) == 1:
+        _init_worker(schema_files, core_schema)
+        outcomes = map(_validate_one, database_files)
+        executor = None
+    else:
+        chunksize = max(1, len(database_files) // (jobs * 4))
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(schema_files, core_schema))
+        outcomes = executor.map(_validate_one, database_files, chunksize=chunksize)
+    try:
+        for database_file, seconds, errors in outcomes:
+            results.append((database_file, seconds, errors))
+            if errors:
+                report(f'{database_file}: INVALID ({len(errors)} errors)')
+                for error in errors:
+                    report(f'    {error}')
+            else:
+                report(f'{database_file}: valid ({seconds*1000:.1f} ms)')
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    elapsed = time.perf_counter() - start
+    n_invalid = sum(1 for result in results if result[2])
+    report(f'{len(results) - n_invalid} valid, {n_invalid} invalid databases in {elapsed:.2f} s ({jobs} workers)')
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m cmgen.validation', description='Validate XML databases against schemas generated by cmgen.')
+    parser.add_argument('databases', nargs='+', help='XML database files')
+    parser.add_argument('-s', '--schema', action='append', required=True, help='generated .rng schema; repeat for databases with several custom models')
+    parser.add_argument('--core', default=None, help='core.rng to use instead of the bundled stand-in')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    args = parser.parse_args(argv)
+    results = validate_files(args.databases, args.schema, core_schema=args.core, jobs=args.jobs)
+    return 1 if any(errors for _, _, errors in results) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())